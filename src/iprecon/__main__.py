@@ -1,108 +1,250 @@
-import io
+import os
 import sys
-import signal
 import argparse
-import getpass
-
-from iprecon.log import error, set_verbose
-from iprecon.client import (
-    RequestMethod,
-    SimpleClient,
-    SimpleWHOISClient,
-    SimpleRDAPClient,
-    BulkRDAPClient,
-)
-from iprecon.ip import is_valid_ip, is_private_ip
-from iprecon.output import OutputFormat, Writer
-from iprecon.utils import clean
-
-from typing import TextIO
-
-STOP = False
-
-
-def handler(signum, frame):
-    global STOP
-    STOP = True
-
-
-signal.signal(signal.SIGINT, handler)
+import contextlib
+
+from iprecon.aggregate import AggregateKey, AggregateWriter
+from iprecon.baseline import DEFAULT_TTL, Baseline, ChangeWriter, parse_duration
+from iprecon.log import close_log, set_log_file, set_verbose, warning
+from iprecon.client import RequestMethod, classify_error, get_provider, providers
+from iprecon.compression import open_input, open_output
+from iprecon.memory import MemoryBudget, MemoryProfiler, parse_size
+from iprecon.metrics import Metrics, serve_metrics
+from iprecon.output import OutputFormat
+from iprecon.packed import PackedInput, is_packed, pack
+from iprecon.pipeline import Pipeline
+from iprecon.profiling import CPUProfiler, summary, write_profile
+from iprecon.retry import NO_RETRY, RetryQueue
+from iprecon.sort import SortKey, SortingWriter
+from iprecon.special import SkipTable, load_skip_list
+from iprecon.warm import DEFAULT_RATE, PacedClient, read_targets, warm
+
+from typing import Optional
+
+STATS_INTERVAL = 10  # seconds between pipeline stats in verbose mode
+# methods that ask the registries and need no local files, the ones warm offers
+WARM_METHODS = [
+    RequestMethod.rdap,
+    RequestMethod.whois,
+    RequestMethod.rdap_bulk,
+    RequestMethod.rdap_whois,
+    RequestMethod.cymru_bulk,
+]
 
 
 def main():
+    if sys.argv[1:2] == ["pack"]:
+        pack_command(sys.argv[2:])
+        return
+    if sys.argv[1:2] == ["warm"]:
+        warm_command(sys.argv[2:])
+        return
+
     args = parse_args()
 
     if args.verbose:
         set_verbose()
-
-    input = args.from_file or sys.stdin
-    output = args.output.get_writer()
-
-    if args.request_method == RequestMethod.rdap:
-        lookup_rdap_whois_iteratively(input=input, output=output)
-    elif args.request_method == RequestMethod.whois:
-        lookup_legacy_whois_iteratively(input=input, output=output)
-    elif args.request_method == RequestMethod.rdap_bulk:
-        lookup_rdap_whois_bulk(input=input, output=output)
+    if args.log_file:
+        set_log_file(args.log_file)
+
+    output_file = open_output(args.output_file) if args.output_file else None
+    try:
+        with contextlib.redirect_stdout(output_file or sys.stdout):
+            if args.profile:
+                profile(args)
+            else:
+                run(args)
+    finally:
+        if output_file:
+            output_file.close()
+        close_log()
+
+
+def profile(args: argparse.Namespace):
+    profiler = CPUProfiler()
+    profiler.start()
+    try:
+        run(args)
+    finally:
+        profiler.stop()
+        stats = profiler.stats()
+        write_profile(stats, args.profile)
+        for line in summary(stats):
+            warning(line)
+
+
+def run(args: argparse.Namespace):
+    if args.from_file and is_packed(args.from_file.name):
+        args.from_file.close()
+        input = PackedInput(args.from_file.name)
     else:
-        raise Exception(
-            "unexpected request method {args.request.method}"
-        )  # should never happen
-
-
-def lookup_legacy_whois_iteratively(input: TextIO, output: Writer):
-    lookup_iteratively(SimpleWHOISClient(), input, output)
-
-
-def lookup_rdap_whois_iteratively(input: TextIO, output: Writer):
-    lookup_iteratively(SimpleRDAPClient(), input, output)
-
-
-def lookup_iteratively(client: SimpleClient, input: TextIO, output: Writer):
-    for line in input:
-        if STOP:
-            return
-        try:
-            s = clean(line)
-            if skip_input(s):
-                continue
-
-            ip = client.get(s)
-            output.write(ip)
-        except Exception as e:
-            error(f"Error for {line.strip()}: {e}")
-
+        input = open_input(args.from_file or sys.stdin.buffer)
+    baseline = None
+    if args.baseline:
+        baseline = Baseline(args.baseline, ttl=args.ttl)
+
+    if args.aggregate:
+        output = AggregateWriter(
+            args.aggregate, args.output, top=args.top, distinct=args.approx_distinct
+        )
+    else:
+        if baseline is not None:
+            output = ChangeWriter(baseline, args.output, updated=args.baseline_output)
+        else:
+            output = args.output.get_writer()
+        if args.sort_by:
+            output = SortingWriter(output, key=args.sort_by)
+
+    client = get_provider(args.request_method, vars(args))
+    retries = None
+    if not client.offline:
+        # with --no-retry errors are still classified, for the summary and
+        # for --concurrency auto
+        policies = NO_RETRY if args.no_retry else None
+        retries = RetryQueue(classify=classify_error, policies=policies)
+
+    extra_skip = [
+        cidr for path in args.skip_list or [] for cidr in load_skip_list(path)
+    ]
+
+    profiler = None
+    if args.profile_memory:
+        profiler = MemoryProfiler()
+        profiler.start()
+
+    metrics, server = None, None
+    if args.metrics_port or args.metrics_file:
+        metrics = Metrics(
+            method=args.request_method,
+            format=str(args.output),
+            textfile=args.metrics_file,
+        )
+    if args.metrics_port:
+        server = serve_metrics(metrics, args.metrics_port)
+
+    pipeline = Pipeline(
+        client=client,
+        output=output,
+        expand_ranges=args.expand_ranges,
+        queue_size=args.queue_size,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency or client.concurrency_limit,
+        adaptive=args.concurrency is None,
+        stats_interval=STATS_INTERVAL if args.verbose else 0,
+        retries=retries,
+        failed_output=args.failed_output,
+        skip=SkipTable.default(extra=extra_skip),
+        memory=MemoryBudget(args.max_memory) if args.max_memory else None,
+        profiler=profiler,
+        metrics=metrics,
+        baseline=baseline,
+    )
+    try:
+        pipeline.run(input)
+    finally:
+        if server:
+            server.shutdown()
 
-def lookup_rdap_whois_bulk(input: TextIO, output: Writer):
-    client = BulkRDAPClient()
+    if profiler:
+        for line in profiler.report():
+            warning(line)
 
-    ips = []
-    for line in input:
-        if STOP:
-            return
 
-        s = clean(line)
-        if skip_input(s):
-            continue
+def pack_command(argv: list[str]):
+    parser = argparse.ArgumentParser(
+        prog="iprecon pack",
+        description="Convert a list of IPs into a packed binary list, which iprecon -f reads faster than text",
+    )
+    parser.add_argument(
+        "-f",
+        "--from-file",
+        type=argparse.FileType("rb"),
+        default=sys.stdin.buffer,
+        help="File with one IP per line, may be gzip, zstd or xz compressed (default: stdin)",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=argparse.FileType("wb"),
+        required=True,
+        help="File to write the packed list to",
+    )
+    args = parser.parse_args(argv)
 
-        ips.append(s)
+    n = pack(open_input(args.from_file), args.output)
+    args.output.close()
+    warning("{n} addresses packed into {path}", n=n, path=args.output.name)
 
-    if len(ips) > 0:
-        results = client.get(ips)
-        for ip in results:
-            output.write(ip)
 
+def warm_command(argv: list[str]):
+    parser = argparse.ArgumentParser(
+        prog="iprecon warm",
+        description="Look up one IP per allocation in known networks, at a fixed rate, and write them for --request-method prefixes --prefixes",
+    )
+    parser.add_argument(
+        "-f",
+        "--from-file",
+        type=argparse.FileType("rb"),
+        default=sys.stdin.buffer,
+        help="File with prefixes, ASNs (AS15169) or JSON output of an earlier run, one per line (default: stdin)",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        required=True,
+        metavar="FILE",
+        help="File to write the networks to, replaced when done",
+    )
+    parser.add_argument(
+        "-m",
+        "--request-method",
+        choices=[str(method) for method in WARM_METHODS],
+        default=str(RequestMethod.rdap),
+        help="Method to look up the networks with",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=DEFAULT_RATE,
+        help=f"Lookups per second (default: {DEFAULT_RATE})",
+    )
+    parser.add_argument(
+        "--lean-rdap",
+        action="store_true",
+        help="with rdap and rdap-whois, fetch and parse only the network fields used in the output (default: False)",
+    )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="store_true",
+        help="output status and error messages (default: False)",
+    )
+    args = parser.parse_args(argv)
+    if args.rate <= 0:
+        parser.error("--rate must be positive")
+    if args.verbose:
+        set_verbose()
 
-def skip_input(s: str) -> bool:
-    if not is_valid_ip(s):
-        error(f"{s} is not a valid IP address")
-        return True
+    networks = read_targets(open_input(args.from_file))
+    client = PacedClient(get_provider(args.request_method, vars(args)), args.rate)
+    try:
+        with open(f"{args.output}.tmp", "w") as out:
+            n = warm(client, networks, out, skip=SkipTable.default())
+        os.replace(f"{args.output}.tmp", args.output)
+    finally:
+        client.client.close()
+        close_log()
+    warning(
+        "{n} networks from {lookups} lookups in {targets} prefixes written to {path}",
+        n=n,
+        lookups=client.lookups,
+        targets=len(networks),
+        path=args.output,
+    )
 
-    if is_private_ip(s):
-        error(f"{s} is a private IP address")
-        return True
 
-    return False
+def concurrency(s: str) -> Optional[int]:
+    return None if s == "auto" else int(s)  # None: adaptive
 
 
 def parse_args():
@@ -111,22 +253,23 @@ def parse_args():
 Examples:
  - iprecon -f ips.txt
  - cat ips.txt | iprecon
+ - echo 203.0.113.0/22 | iprecon
+ - iprecon pack -f ips.txt -o ips.iprb && iprecon -f ips.iprb
 """,
         formatter_class=argparse.RawTextHelpFormatter,
     )
     parser.add_argument(
         "-f",
         "--from-file",
-        type=argparse.FileType("r"),
-        help="File with IP addresses, one per line (IPs read from stdin if not given)",
+        type=argparse.FileType("rb"),
+        help="File with IP addresses or ranges (CIDR or first-last), one per line, may be gzip, zstd or xz compressed (read from stdin if not given)",
     )
     parser.add_argument(
         "-m",
         "--request-method",
-        type=RequestMethod,
-        choices=list(RequestMethod),
-        default=RequestMethod.rdap,
-        help="Method to use for data collection. Can be legacy WHOIS, RDAP or bulk RDAP requests (experimental, only for huge lists)",
+        choices=list(providers()),
+        default=str(RequestMethod.rdap),
+        help="Method to use for data collection. Can be legacy WHOIS, RDAP, bulk RDAP requests (experimental, only for huge lists), RDAP with WHOIS as fallback per IP or any installed plugin",
     )
     parser.add_argument(
         "-o",
@@ -136,6 +279,153 @@ Examples:
         default=OutputFormat.text,
         help=f"Format for output of result data",
     )
+    parser.add_argument(
+        "-O",
+        "--output-file",
+        metavar="FILE",
+        help="Write output to FILE instead of stdout, compressed if FILE ends in .gz, .zst or .xz",
+    )
+    parser.add_argument(
+        "--cymru-host",
+        default="whois.cymru.com",
+        help="Server for cymru-bulk as host[:port], e.g. a local mirror (default: whois.cymru.com)",
+    )
+    parser.add_argument(
+        "--mmdb",
+        help="MaxMind-format ASN database (e.g. GeoLite2-ASN.mmdb) for the mmdb and mmdb-rdap request methods",
+    )
+    parser.add_argument(
+        "--prefixes",
+        help="JSON output of an earlier run (-o json) whose networks the prefixes request method matches IPs against",
+    )
+    record = parser.add_mutually_exclusive_group()
+    record.add_argument(
+        "--record",
+        metavar="DIR",
+        help="store the raw RDAP and WHOIS responses of the rdap, whois and rdap-whois request methods in DIR",
+    )
+    record.add_argument(
+        "--replay",
+        metavar="DIR",
+        help="answer RDAP and WHOIS requests from responses stored with --record instead of asking registries",
+    )
+    parser.add_argument(
+        "--lean-rdap",
+        action="store_true",
+        help="with rdap and rdap-whois, fetch and parse only the network fields used in the output; --aggregate org then groups by network name instead of ASN description (default: False)",
+    )
+    parser.add_argument(
+        "--parse-workers",
+        type=int,
+        default=0,
+        metavar="N",
+        help="with whois and rdap-whois, parse WHOIS responses in N worker processes instead of the lookup threads (default: 0)",
+    )
+    parser.add_argument(
+        "--sort-by",
+        type=SortKey,
+        choices=list(SortKey),
+        help="Sort output by IP, ASN or network (results are shown at the end, large outputs are sorted on disk)",
+    )
+    parser.add_argument(
+        "--aggregate",
+        type=AggregateKey,
+        choices=list(AggregateKey),
+        help="Output only the number of IPs per ASN, network, org or registry instead of one row per IP",
+    )
+    parser.add_argument(
+        "--top",
+        type=int,
+        help="With --aggregate, output only the N largest groups",
+    )
+    parser.add_argument(
+        "--approx-distinct",
+        action="store_true",
+        help="With --aggregate, add an approximate count of distinct networks per group (distinct ASNs per network)",
+    )
+    parser.add_argument(
+        "--expand-ranges",
+        action="store_true",
+        help="output one row per IP for ranges instead of one row per network (default: False)",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=1000,
+        help="Maximum number of items buffered between pipeline stages (default: 1000)",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=concurrency,
+        default=1,
+        help="Number of lookups to run at the same time, capped by the request method, or 'auto' to adapt it to latency and errors per server (default: 1)",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=1000,
+        help="Number of IPs per request for request methods that support batches, like rdap-bulk (default: 1000)",
+    )
+    parser.add_argument(
+        "--no-retry",
+        action="store_true",
+        help="do not retry failed lookups (default: False)",
+    )
+    parser.add_argument(
+        "--failed-output",
+        type=argparse.FileType("w"),
+        help="File to write IPs to whose lookup failed for good, one per line",
+    )
+    parser.add_argument(
+        "--skip-list",
+        action="append",
+        help="File with additional IPs or CIDRs to skip, one per line (can be given multiple times)",
+    )
+    parser.add_argument(
+        "--max-memory",
+        type=parse_size,
+        help="Memory budget like 512M or 2G, enforced by shrinking batches, forgetting seen IPs and spilling sort buffers to disk",
+    )
+    parser.add_argument(
+        "--profile-memory",
+        action="store_true",
+        help="trace allocations per pipeline stage and print the top allocators at exit (slow, default: False)",
+    )
+    parser.add_argument(
+        "--baseline",
+        metavar="FILE",
+        help="previous JSON output (-o json); only new IPs and IPs checked longer than --ttl ago are looked up, and only changes are printed",
+    )
+    parser.add_argument(
+        "--ttl",
+        type=parse_duration,
+        default=DEFAULT_TTL,
+        help="how long baseline results stay valid, like 3600, 90m, 12h or 7d (default: 7d)",
+    )
+    parser.add_argument(
+        "--baseline-output",
+        metavar="FILE",
+        help="File to write the updated baseline to when done, to be used as --baseline next time (may be the --baseline file)",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        help="serve Prometheus/OpenMetrics metrics on http://0.0.0.0:PORT/metrics while running",
+    )
+    parser.add_argument(
+        "--metrics-file",
+        help="write Prometheus/OpenMetrics metrics to this file every 15 seconds, e.g. for node_exporter's textfile collector",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="FILE",
+        help="run under cProfile, write stats to FILE (collapsed stacks for flame graphs if it ends in .folded) and print the hottest iprecon and ipwhois functions",
+    )
+    parser.add_argument(
+        "--log-file",
+        type=argparse.FileType("w"),
+        help="File to write all messages to as JSON lines, with or without -v; repeated messages are rate limited like on stderr",
+    )
     parser.add_argument(
         "-v",
         "--verbose",
@@ -143,7 +433,14 @@ Examples:
         help="output status and error messages (default: False)",
     )
 
-    return parser.parse_args()
+    args = parser.parse_args()
+    if args.baseline and args.aggregate:
+        parser.error("--baseline cannot be combined with --aggregate")
+    if args.baseline_output and not args.baseline:
+        parser.error("--baseline-output requires --baseline")
+    if args.parse_workers < 0:
+        parser.error("--parse-workers must not be negative")
+    return args
 
 
 if __name__ == "__main__":
@@ -0,0 +1,158 @@
+import json
+import math
+import heapq
+import hashlib
+
+from enum import Enum
+from typing import Optional
+
+from iprecon.ip import IPAddress
+from iprecon.output import OutputFormat, Writer
+from iprecon.ranges import IPRange
+from iprecon.utils import clean
+
+# groups keep their distinct keys exactly up to this many, then switch to a
+# 4 KiB HyperLogLog, so the many small groups cost a few entries each
+EXACT_DISTINCT = 256
+
+
+class AggregateKey(Enum):
+    asn = "asn"
+    network = "network"
+    org = "org"
+    registry = "registry"
+
+    def __str__(self):
+        return self.value
+
+
+class AggregateWriter(Writer):
+    # keeps one counter per key and prints only the summary on close,
+    # so memory depends on the number of distinct keys, not of IPs
+    def __init__(
+        self,
+        key: AggregateKey,
+        format: OutputFormat,
+        top: Optional[int] = None,
+        distinct: bool = False,
+    ):
+        self.key = key
+        self.format = format
+        self.top = top
+        self.distinct = distinct
+        self.counts: dict[str, int] = {}
+        self.sketches: dict[str, DistinctCounter] = {}
+
+    def write(self, ip: IPAddress):
+        k = aggregate_key(self.key, ip)
+        n = int(ip.last) - int(ip.first) + 1 if isinstance(ip, IPRange) else 1
+        self.counts[k] = self.counts.get(k, 0) + n
+
+        if self.distinct:
+            sketch = self.sketches.get(k)
+            if sketch is None:
+                sketch = self.sketches[k] = DistinctCounter()
+            sketch.add(distinct_key(self.key, ip))
+
+    def close(self):
+        if self.top:
+            rows = heapq.nlargest(self.top, self.counts.items(), key=lambda kv: kv[1])
+        else:
+            rows = sorted(self.counts.items(), key=lambda kv: (-kv[1], kv[0]))
+
+        self._print_header()
+        for k, count in rows:
+            distinct = self.sketches[k].count() if self.distinct else None
+            self._print(k, count, distinct)
+
+    def _print_header(self):
+        if self.format == OutputFormat.text:
+            distinct = f" {'distinct':>12s}" if self.distinct else ""
+            print(f"{'IPs':>12s}{distinct} {self.key}")
+        elif self.format == OutputFormat.csv:
+            print(f"{self.key},ips" + (",distinct" if self.distinct else ""))
+
+    def _print(self, k: str, count: int, distinct: Optional[int]):
+        if self.format == OutputFormat.json:
+            row = {str(self.key): k, "ips": count}
+            if self.distinct:
+                row["distinct"] = distinct
+            print(json.dumps(row))
+        elif self.format == OutputFormat.csv:
+            cols = [k.replace(",", " "), str(count)]
+            if self.distinct:
+                cols.append(str(distinct))
+            print(",".join(cols))
+        else:
+            distinct = f" {distinct:>12d}" if self.distinct else ""
+            print(f"{count:>12d}{distinct} {k}")
+
+
+def distinct_key(key: AggregateKey, ip: IPAddress) -> str:
+    # distinct networks per ASN/org/registry, distinct ASNs per network
+    if key == AggregateKey.network:
+        return aggregate_key(AggregateKey.asn, ip)
+    return aggregate_key(AggregateKey.network, ip)
+
+
+def aggregate_key(key: AggregateKey, ip: IPAddress) -> str:
+    if key == AggregateKey.asn:
+        return str(ip.as_number() or "???")
+    if key == AggregateKey.network:
+        network = ip.network()
+        return network.string(0) if network else "???"
+    if key == AggregateKey.registry:
+        registry = ip.rdap_info.get("asn_registry") or ip.whois_info.get("asn_registry")
+        return str(registry or "???")
+
+    org = ip.rdap_info.get("asn_description") or ip.whois_info.get("asn_description")
+    if not org:
+        network = ip.network()
+        org = network.shortname(0) if network else "???"
+    return clean(org)
+
+
+class DistinctCounter:
+    # exact set of keys until there are more than limit, a HyperLogLog after
+    def __init__(self, limit: int = EXACT_DISTINCT):
+        self.limit = limit
+        self.exact: Optional[set[str]] = set()
+        self.sketch: Optional[HyperLogLog] = None
+
+    def add(self, s: str):
+        if self.exact is None:
+            self.sketch.add(s)
+            return
+        self.exact.add(s)
+        if len(self.exact) > self.limit:
+            self.sketch = HyperLogLog()
+            for key in self.exact:
+                self.sketch.add(key)
+            self.exact = None
+
+    def count(self) -> int:
+        return len(self.exact) if self.exact is not None else self.sketch.count()
+
+
+class HyperLogLog:
+    # approximate distinct counter, about 1.6% standard error at p=12
+    def __init__(self, p: int = 12):
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(self.m)
+
+    def add(self, s: str):
+        h = int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), "big")
+        idx = h >> (64 - self.p)
+        rest = h & ((1 << (64 - self.p)) - 1)
+        rank = (64 - self.p) - rest.bit_length() + 1
+        if rank > self.registers[idx]:
+            self.registers[idx] = rank
+
+    def count(self) -> int:
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m * self.m / sum(2.0**-r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * self.m and zeros:
+            estimate = self.m * math.log(self.m / zeros)  # linear counting
+        return round(estimate)
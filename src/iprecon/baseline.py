@@ -0,0 +1,188 @@
+import os
+import re
+import json
+import time
+import ipaddress
+
+from typing import Callable, Iterator, Optional, TextIO
+
+from iprecon.ip import IPAddress, parse_range
+from iprecon.log import error, info
+from iprecon.output import OutputFormat, Writer, json_record
+from iprecon.ranges import IPRange
+
+DEFAULT_TTL = 7 * 24 * 3600
+
+UNITS = {"": 1, "s": 1, "m": 60, "h": 3600, "d": 24 * 3600, "w": 7 * 24 * 3600}
+
+# what a change is judged by: ASN and smallest network
+Entry = tuple[str, str]
+
+
+def parse_duration(s: str) -> int:
+    # "3600", "90m", "12h", "7d"
+    m = re.fullmatch(r"\s*(\d+)\s*([smhdw]?)\s*", s.lower())
+    if not m:
+        raise ValueError(f"{s} is not a valid duration")
+    return int(m.group(1)) * UNITS[m.group(2)]
+
+
+class Baseline:
+    # compact index of a previous JSON output: packed IP -> (checked, asn,
+    # network), with strings shared between IPs of the same network
+    def __init__(
+        self, path: str, ttl: int = DEFAULT_TTL, clock: Callable = time.time
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.clock = clock
+        self.index: dict[bytes, tuple[int, str, str]] = {}
+
+        strings: dict[str, str] = {}
+        for key, record in read_records(path):
+            checked = record["checked"]
+            asn, network = entry(record)
+            asn = strings.setdefault(asn, asn)
+            network = strings.setdefault(network, network)
+            self.index[key] = (checked, asn, network)
+
+    def get(self, ip: str) -> Optional[Entry]:
+        found = self.index.get(ip_key(ip))
+        return found[1:] if found else None
+
+    def fresh(self, ip: str) -> bool:
+        found = self.index.get(ip_key(ip))
+        return found is not None and self.clock() - found[0] < self.ttl
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+
+class ChangeWriter(Writer):
+    # prints only IPs that are new or whose ASN or network changed, and can
+    # write an updated baseline with fresh results plus the untouched entries;
+    # it replaces the file at path updated on close, which may be the baseline
+    def __init__(
+        self,
+        baseline: Baseline,
+        format: OutputFormat,
+        updated: Optional[str] = None,
+    ):
+        self.baseline = baseline
+        self.format = format
+        self.updated = updated
+        self._updated_file: Optional[TextIO] = None
+        if updated:
+            self._updated_file = open(f"{updated}.tmp", "w")
+        self._written: set[bytes] = set()
+        self._ranges: list[tuple[bytes, bytes]] = []  # looked up in this run
+        self._print_header()
+
+    def write(self, ip: IPAddress):
+        record = json_record(ip)
+        new = entry(record)
+        old = self.baseline.get(record["ip"])
+        if old != new:
+            self._print(record["ip"], old, new)
+
+        if self._updated_file:
+            record["checked"] = int(self.baseline.clock())
+            print(json.dumps(record), file=self._updated_file)
+            if (key := ip_key(record["ip"])) is not None:
+                self._written.add(key)
+            if isinstance(ip, IPRange):
+                self._ranges.append((ip.first.packed, ip.last.packed))
+
+    def close(self):
+        if not self._updated_file:
+            return
+        for key, record in read_records(self.baseline.path):
+            if key not in self._written and not self._replaced(key):
+                print(json.dumps(record), file=self._updated_file)
+        self._updated_file.close()
+        os.replace(f"{self.updated}.tmp", self.updated)
+
+    def _replaced(self, key: bytes) -> bool:
+        # an old range row that overlaps a range looked up in this run, which
+        # may have been split into allocations differently since
+        if len(key) not in (8, 32):
+            return False
+        first, last = key[: len(key) // 2], key[len(key) // 2 :]
+        return any(
+            len(start) == len(first) and first <= end and start <= last
+            for start, end in self._ranges
+        )
+
+    def _print_header(self):
+        if self.format == OutputFormat.text:
+            print(f"{'IP':>39s} {'old ASN':>8s} {'new ASN':>8s} network")
+        elif self.format == OutputFormat.csv:
+            print("ip,old_asn,old_network,new_asn,new_network")
+
+    def _print(self, ip: str, old: Optional[Entry], new: Entry):
+        old_asn, old_network = old or ("", "")
+        new_asn, new_network = new
+        if self.format == OutputFormat.json:
+            row = {
+                "ip": ip,
+                "old": {"asn": old_asn, "network": old_network} if old else None,
+                "new": {"asn": new_asn, "network": new_network},
+            }
+            print(json.dumps(row))
+        elif self.format == OutputFormat.csv:
+            cols = [ip, old_asn, old_network, new_asn, new_network]
+            print(",".join(c.replace(",", " ") for c in cols))
+        else:
+            network = f"{old_network or '(new)'} -> {new_network}"
+            print(f"{ip:>39s} {old_asn or '-':>8s} {new_asn:>8s} {network}")
+
+
+def read_records(path: str) -> Iterator[tuple[bytes, dict]]:
+    # records without a "checked" time (plain JSONWriter output) count as
+    # checked when the file was last modified
+    if not os.path.exists(path):
+        info("{path} does not exist yet, starting with an empty baseline", path=path)
+        return
+    mtime = int(os.path.getmtime(path))
+    with open(path) as f:
+        for n, line in enumerate(f, 1):
+            try:
+                record = json.loads(line)
+                key = ip_key(record["ip"])
+            except (ValueError, KeyError, TypeError):
+                error(
+                    "{path}:{n} is not a valid result line",
+                    path=path,
+                    n=n,
+                    event="bad-line",
+                )
+                continue
+            if key is None:
+                error(
+                    "{path}:{n} is not a valid result line",
+                    path=path,
+                    n=n,
+                    event="bad-line",
+                )
+                continue
+            record.setdefault("checked", mtime)
+            yield key, record
+
+
+def entry(record: dict) -> Entry:
+    networks = record.get("networks") or [{}]
+    return str(record.get("asn")), str(networks[0].get("cidr"))
+
+
+def ip_key(ip: str) -> Optional[bytes]:
+    # packed address, or packed first and last address of a range row; ranges
+    # are looked up on every run, but compared with their baseline entry
+    try:
+        return ipaddress.ip_address(ip).packed
+    except ValueError:
+        pass
+    try:
+        first, last = parse_range(ip)
+    except ValueError:
+        return None
+    return first.packed + last.packed
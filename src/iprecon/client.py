@@ -1,37 +1,156 @@
 import abc
+import re
+import json
+import socket
+import asyncio
+import threading
 import ipaddress
+import multiprocessing
+import concurrent.futures
+import importlib.metadata
 import ipwhois
+import ipwhois.exceptions
 import ipwhois.experimental
+import ipwhois.rdap
+import ipwhois.utils
+import ipwhois.whois
 
+from iprecon.concurrency import RegistryMap
 from iprecon.ip import IPAddress
+from iprecon.log import error
+from iprecon.prefixes import load_prefixes
+from iprecon.replay import ResponseStore
+from iprecon.retry import ErrorClass
 
-from typing import Optional, Union, Any
+from typing import Optional, Union, Any, AsyncIterator, Iterable
 from enum import Enum
 
 # from pprint import PrettyPrinter
 
 
 class SimpleClient(metaclass=abc.ABCMeta):
+    supports_batching = False  # get_many does better than one get per IP
+    concurrency_limit = 1  # maximum number of lookups to run at the same time
+    offline = False  # no network access, so errors are never worth a retry
+
+    @classmethod
+    def from_options(cls, options: dict[str, Any]) -> "SimpleClient":
+        # options are the parsed command line arguments
+        return cls()
+
     @abc.abstractmethod
     def get(self, ip: str) -> IPAddress:
         raise NotImplementedError
 
+    async def get_many(self, ips: Iterable[str]) -> AsyncIterator[IPAddress]:
+        for ip in ips:
+            yield await asyncio.to_thread(self.get, ip)
+
+    def upstream(self, ip: str) -> str:
+        # server asked for ip; with --concurrency auto, each gets its own limit
+        return "default"
+
+    def close(self):
+        pass
+
 
 class SimpleWHOISClient(SimpleClient):
+    # fetches in the lookup thread; parsing the free-text response is CPU-bound
+    # and can go to a pool of parse_workers processes instead, so it does not
+    # hold the GIL the other lookup threads need
+    concurrency_limit = 4
+
+    def __init__(self, store: Optional[ResponseStore] = None, parse_workers: int = 0):
+        self.store = store
+        self.parse_workers = parse_workers
+        self.registries = RegistryMap()
+        self._pool: Optional[concurrent.futures.ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_options(cls, options: dict[str, Any]) -> "SimpleWHOISClient":
+        return cls(
+            store=ResponseStore.from_options(options),
+            parse_workers=options.get("parse_workers") or 0,
+        )
+
+    def upstream(self, ip: str) -> str:
+        return f"whois:{self.registries.get(ip)}"
+
     def get(self, ip: str) -> IPAddress:
         ipobj = ipaddress.ip_address(ip)
-        whois_info = ipwhois.IPWhois(ip).lookup_whois()
+        obj = new_ipwhois(ip, self.store)
+        asn_data = obj.ipasn.lookup()
+        self.registries.learn(ip, asn_data.get("asn_registry"))
+        raw = obj.net.get_whois(asn_registry=asn_data["asn_registry"], retry_count=3)
+
+        if self.parse_workers > 0:
+            nets = self._parser().submit(parse_whois_nets, ip, raw, asn_data).result()
+        else:
+            nets = parse_whois_nets(ip, raw, asn_data)
 
         # pp = PrettyPrinter()
-        # pp.pprint(whois_info)
+        # pp.pprint(nets)
 
+        whois_info = dict(asn_data, nets=nets)
         return IPAddress(ip=ipobj, whois_info=whois_info, rdap_info=None)
 
+    def _parser(self) -> concurrent.futures.ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.parse_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._pool
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+
+
+def parse_whois_nets(ip: str, raw: str, asn_data: dict) -> list[dict]:
+    # runs in worker processes: parses a raw response like IPWhois.lookup_whois
+    # and returns only the fields IPAddress reads
+    net = ipwhois.net.Net(ip)
+    whois = ipwhois.whois.Whois(net).lookup(
+        response=raw, asn_data=asn_data, is_offline=True
+    )
+    return [
+        {
+            "cidr": n.get("cidr"),
+            "name": n.get("name"),
+            "description": n.get("description"),
+        }
+        for n in whois["nets"]
+    ]
+
 
 class SimpleRDAPClient(SimpleClient):
+    concurrency_limit = 16
+
+    def __init__(self, lean: bool = False, store: Optional[ResponseStore] = None):
+        self.lean = lean
+        self.store = store
+        self.registries = RegistryMap()
+
+    @classmethod
+    def from_options(cls, options: dict[str, Any]) -> "SimpleRDAPClient":
+        return cls(
+            lean=bool(options.get("lean_rdap")),
+            store=ResponseStore.from_options(options),
+        )
+
+    def upstream(self, ip: str) -> str:
+        return f"rdap:{self.registries.get(ip)}"
+
     def get(self, ip: str) -> IPAddress:
         ipobj = ipaddress.ip_address(ip)
-        rdap_info = ipwhois.IPWhois(ip).lookup_rdap()
+        if self.lean:
+            rdap_info = lookup_rdap_lean(ip, self.store)
+        else:
+            rdap_info = new_ipwhois(ip, self.store).lookup_rdap()
+        self.registries.learn(ip, rdap_info.get("asn_registry"))
 
         # pp = PrettyPrinter()
         # pp.pprint(rdap_info)
@@ -39,8 +158,137 @@ class SimpleRDAPClient(SimpleClient):
         return IPAddress(ip=ipobj, whois_info=None, rdap_info=rdap_info)
 
 
-class BulkRDAPClient:
-    def get(self, ips: list[str]) -> list[IPAddress]:
+def new_ipwhois(ip: str, store: Optional[ResponseStore] = None) -> ipwhois.IPWhois:
+    obj = ipwhois.IPWhois(ip)
+    return store.instrument(obj) if store else obj
+
+
+def lookup_rdap_lean(ip: str, store: Optional[ResponseStore] = None) -> dict:
+    # like IPWhois.lookup_rdap, but skips the ASN description, NIR and entity
+    # lookups and parses only the network fields IPAddress reads; without
+    # asn_description, --aggregate org falls back to the network name
+    obj = new_ipwhois(ip, store)
+    asn_data = obj.ipasn.lookup(get_asn_description=False)
+
+    url = str(ipwhois.rdap.RIR_RDAP[asn_data["asn_registry"]]["ip_url"])
+    response = obj.net.get_http_json(url=url.format(obj.address_str), retry_count=3)
+
+    rdap_info = dict(asn_data)
+    rdap_info["network"] = parse_rdap_network(response)
+    return rdap_info
+
+
+def parse_rdap_network(response: Any) -> dict:
+    # same values as ipwhois.rdap._RDAPNetwork for cidr, name and remarks
+    try:
+        response["handle"].strip()
+        version = response["ipVersion"].strip()
+        start, end = response["startAddress"], response["endAddress"]
+        if version == "v4":
+            start = str(ipaddress.ip_address(ipwhois.utils.ipv4_lstrip_zeros(start)))
+            end = str(ipaddress.ip_address(ipwhois.utils.ipv4_lstrip_zeros(end)))
+        else:
+            start, end = start.strip(), end.strip()
+    except (KeyError, ValueError, TypeError, AttributeError):
+        raise ipwhois.exceptions.InvalidNetworkObject(
+            "IP address data is missing for RDAP network object."
+        )
+
+    try:
+        cidr = ", ".join(ipwhois.utils.calculate_cidr(start, end))
+    except (KeyError, ValueError, TypeError, AttributeError):
+        cidr = None
+
+    try:
+        name = response["name"].strip()
+    except (KeyError, ValueError, AttributeError):
+        name = None
+
+    remarks = None
+    if isinstance(response.get("remarks"), list):
+        remarks = [parse_rdap_remark(remark) for remark in response["remarks"]]
+        remarks = [remark for remark in remarks if remark]
+
+    return {"cidr": cidr, "name": name, "remarks": remarks}
+
+
+def parse_rdap_remark(remark: Any) -> Optional[dict]:
+    # mirrors ipwhois.rdap._RDAPCommon.summarize_notices, without the links
+    try:
+        title = remark["title"]
+    except (KeyError, ValueError, TypeError):
+        title = None
+
+    try:
+        description = "\n".join(remark["description"])
+    except (KeyError, ValueError, TypeError):
+        description = None
+
+    if not (title or description or remark.get("links")):
+        return None
+    return {"title": title, "description": description}
+
+
+class FallbackClient(SimpleClient):
+    # asks the fallback client only for IPs the primary one has no networks for
+    def __init__(self, primary: SimpleClient, fallback: SimpleClient):
+        self.primary = primary
+        self.fallback = fallback
+        self.concurrency_limit = min(
+            primary.concurrency_limit, fallback.concurrency_limit
+        )
+
+    @classmethod
+    def from_options(cls, options: dict[str, Any]) -> "FallbackClient":
+        return cls(
+            SimpleRDAPClient.from_options(options),
+            SimpleWHOISClient.from_options(options),
+        )
+
+    def upstream(self, ip: str) -> str:
+        return self.primary.upstream(ip)
+
+    def get(self, ip: str) -> IPAddress:
+        try:
+            first = self.primary.get(ip)
+        except Exception as e:
+            error("Error for {ip}, falling back: {e}", ip=ip, e=e, event="fallback")
+            return self.fallback.get(ip)
+
+        if first.networks():
+            return first
+
+        try:
+            second = self.fallback.get(ip)
+        except Exception as e:
+            error("Error for {ip} in fallback: {e}", ip=ip, e=e, event="fallback-error")
+            return first
+
+        return IPAddress(
+            ip=first.ip,
+            whois_info=second.whois_info or first.whois_info,
+            rdap_info=first.rdap_info or second.rdap_info,
+        )
+
+    def close(self):
+        self.primary.close()
+        self.fallback.close()
+
+
+class BulkRDAPClient(SimpleClient):
+    supports_batching = True
+
+    def get(self, ip: str) -> IPAddress:
+        results = self.lookup([ip])
+        if not results:
+            raise Exception(f"no bulk RDAP result for {ip}")
+        return results[0]
+
+    async def get_many(self, ips: Iterable[str]) -> AsyncIterator[IPAddress]:
+        for ip in await asyncio.to_thread(self.lookup, list(ips)):
+            yield ip
+
+    def lookup(self, ips: list[str]) -> list[IPAddress]:
         results, stats = ipwhois.experimental.bulk_lookup_rdap(addresses=ips)
 
         out = [
@@ -54,10 +302,312 @@ class BulkRDAPClient:
         return out
 
 
+class CymruBulkClient(SimpleClient):
+    # Team Cymru bulk whois: one TCP session, "begin", IPs, "end", with one
+    # pipe-delimited line per IP, e.g.
+    # 15169 | 8.8.8.8 | 8.8.8.0/24 | US | arin | 2023-12-28 | GOOGLE, US
+    supports_batching = True
+
+    def __init__(self, host: str = "whois.cymru.com", port: int = 43):
+        self.host = host
+        self.port = port
+        self.timeout = 60
+        self._lock = threading.Lock()
+        self._sock: Optional[socket.socket] = None
+        self._file: Any = None
+
+    @classmethod
+    def from_options(cls, options: dict[str, Any]) -> "CymruBulkClient":
+        value = options.get("cymru_host") or "whois.cymru.com"
+        if value.startswith("["):  # [IPv6]:port
+            host, _, port = value[1:].partition("]")
+            port = port.lstrip(":")
+        else:
+            host, _, port = value.partition(":")
+        return cls(host=host, port=int(port or 43))
+
+    def get(self, ip: str) -> IPAddress:
+        # a session of its own, the shared one belongs to get_many
+        with socket.create_connection((self.host, self.port), self.timeout) as sock:
+            with sock.makefile("rw", encoding="utf-8", newline="\n") as f:
+                f.write(f"begin\nverbose\n{ip}\nend\n")
+                f.flush()
+                return read_cymru_lines(f, 1)[0]
+
+    async def get_many(self, ips: Iterable[str]) -> AsyncIterator[IPAddress]:
+        for ip in await asyncio.to_thread(self.lookup, list(ips)):
+            yield ip
+
+    def lookup(self, ips: list[str]) -> list[IPAddress]:
+        with self._lock:
+            if self._file is None:
+                self._sock = socket.create_connection(
+                    (self.host, self.port), self.timeout
+                )
+                self._file = self._sock.makefile("rw", encoding="utf-8", newline="\n")
+                self._file.write("begin\nverbose\n")
+
+            try:
+                self._file.write("".join(f"{ip}\n" for ip in ips))
+                self._file.flush()
+                return read_cymru_lines(self._file, len(ips))
+            except Exception:
+                self._close()  # the session is out of sync, start over next time
+                raise
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                try:
+                    self._file.write("end\n")
+                    self._file.flush()
+                except OSError:
+                    pass
+            self._close()
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+        if self._sock is not None:
+            self._sock.close()
+        self._file, self._sock = None, None
+
+
+def read_cymru_lines(f: Any, n: int) -> list[IPAddress]:
+    out = []
+    while len(out) < n:
+        line = f.readline()
+        if not line:
+            raise ConnectionError("Cymru bulk whois closed the connection")
+        if line.startswith("Bulk mode;"):
+            continue  # header sent once per session
+        if line.startswith("Error:"):
+            raise ValueError(f"Cymru bulk whois: {line.strip()}")
+        out.append(parse_cymru_line(line))
+    return out
+
+
+def parse_cymru_line(line: str) -> IPAddress:
+    # same keys as the ASN part of ipwhois results
+    cols = [col.strip() for col in line.split("|")]
+    if len(cols) < 3:
+        raise ValueError(f"unexpected Cymru bulk whois line: {line.strip()}")
+    cols += [""] * (7 - len(cols))
+
+    def value(col: str) -> Optional[str]:
+        return None if col in ("", "NA") else col
+
+    return IPAddress(
+        ip=ipaddress.ip_address(cols[1]),
+        whois_info=None,
+        rdap_info={
+            "asn": value(cols[0]),
+            "asn_cidr": value(cols[2]),
+            "asn_country_code": value(cols[3]),
+            "asn_registry": value(cols[4]),
+            "asn_date": value(cols[5]),
+            "asn_description": value(cols[6]),
+        },
+    )
+
+
+class MMDBClient(SimpleClient):
+    # local MaxMind-format database (GeoLite2-ASN, IPinfo, ...), memory-mapped
+    supports_batching = True
+    concurrency_limit = 16
+    offline = True
+
+    def __init__(self, path: str):
+        try:
+            import maxminddb
+        except ImportError:
+            raise Exception("MMDB support needs maxminddb: pip install iprecon[mmdb]")
+
+        self.reader = maxminddb.open_database(path, mode=maxminddb.MODE_AUTO)
+
+    @classmethod
+    def from_options(cls, options: dict[str, Any]) -> "MMDBClient":
+        if not options.get("mmdb"):
+            raise Exception("this request method needs a database, use --mmdb FILE")
+        return cls(options["mmdb"])
+
+    def get(self, ip: str) -> IPAddress:
+        ipobj = ipaddress.ip_address(ip)
+        record, prefixlen = self.reader.get_with_prefix_len(ipobj)
+        return IPAddress(
+            ip=ipobj, whois_info=None, rdap_info=mmdb_info(ipobj, record, prefixlen)
+        )
+
+    async def get_many(self, ips: Iterable[str]) -> AsyncIterator[IPAddress]:
+        # one thread hop per batch, lookups themselves take microseconds
+        for ip in await asyncio.to_thread(lambda: [self.get(ip) for ip in ips]):
+            yield ip
+
+    def close(self):
+        self.reader.close()
+
+
+def mmdb_info(
+    ip: Union[ipaddress.IPv4Address, ipaddress.IPv6Address],
+    record: Any,
+    prefixlen: int,
+) -> dict:
+    # maps GeoLite2-ASN and IPinfo style records to ipwhois style keys
+    if not isinstance(record, dict):
+        return {}
+
+    asn = record.get("autonomous_system_number") or record.get("asn")
+    if isinstance(asn, str) and asn.upper().startswith("AS"):
+        asn = asn[2:]
+    name = (
+        record.get("autonomous_system_organization")
+        or record.get("as_name")
+        or record.get("name")
+    )
+    cidr = str(ipaddress.ip_network(f"{ip}/{prefixlen}", strict=False))
+
+    return {
+        "asn": str(asn) if asn else None,
+        "asn_cidr": cidr,
+        "asn_country_code": record.get("country_code"),
+        "asn_description": name,
+        "network": {"cidr": cidr, "name": name},
+    }
+
+
+class MMDBRDAPClient(FallbackClient):
+    # MMDB as a pre-filter, RDAP only for IPs missing from the database
+    @classmethod
+    def from_options(cls, options: dict[str, Any]) -> "MMDBRDAPClient":
+        return cls(
+            MMDBClient.from_options(options), SimpleRDAPClient.from_options(options)
+        )
+
+
+class PrefixClient(SimpleClient):
+    # longest-prefix match against networks from earlier JSON output
+    supports_batching = True
+    concurrency_limit = 16
+    offline = True
+
+    def __init__(self, path: str):
+        self.table = load_prefixes(path)
+
+    @classmethod
+    def from_options(cls, options: dict[str, Any]) -> "PrefixClient":
+        if not options.get("prefixes"):
+            raise Exception("this request method needs networks, use --prefixes FILE")
+        return cls(options["prefixes"])
+
+    def get(self, ip: str) -> IPAddress:
+        ipobj = ipaddress.ip_address(ip)
+        return IPAddress(ip=ipobj, whois_info=self.table.get(ipobj), rdap_info=None)
+
+    async def get_many(self, ips: Iterable[str]) -> AsyncIterator[IPAddress]:
+        for ip in await asyncio.to_thread(self._get_many, list(ips)):
+            yield ip
+
+    def _get_many(self, ips: list[str]) -> list[IPAddress]:
+        ipobjs = [ipaddress.ip_address(ip) for ip in ips]
+        infos = self.table.get_many(ipobjs)
+        return [
+            IPAddress(ip=ipobj, whois_info=info, rdap_info=None)
+            for ipobj, info in zip(ipobjs, infos)
+        ]
+
+
 class RequestMethod(Enum):
     whois = "whois"
     rdap = "rdap"
     rdap_bulk = "rdap-bulk"
+    rdap_whois = "rdap-whois"
+    cymru_bulk = "cymru-bulk"
+    mmdb = "mmdb"
+    mmdb_rdap = "mmdb-rdap"
+    prefixes = "prefixes"
 
     def __str__(self):
         return self.value
+
+
+PROVIDERS: dict[str, type[SimpleClient]] = {
+    str(RequestMethod.whois): SimpleWHOISClient,
+    str(RequestMethod.rdap): SimpleRDAPClient,
+    str(RequestMethod.rdap_bulk): BulkRDAPClient,
+    str(RequestMethod.rdap_whois): FallbackClient,
+    str(RequestMethod.cymru_bulk): CymruBulkClient,
+    str(RequestMethod.mmdb): MMDBClient,
+    str(RequestMethod.mmdb_rdap): MMDBRDAPClient,
+    str(RequestMethod.prefixes): PrefixClient,
+}
+
+# packages add request methods with an entry point in this group that
+# points to a SimpleClient subclass, e.g. "mmdb = mypkg.client:MMDBClient"
+PROVIDER_ENTRY_POINTS = "iprecon.providers"
+ProviderEntryPoint = importlib.metadata.EntryPoint
+
+
+def providers() -> dict[str, Union[type[SimpleClient], ProviderEntryPoint]]:
+    out = dict(PROVIDERS)
+    for ep in importlib.metadata.entry_points(group=PROVIDER_ENTRY_POINTS):
+        if ep.name not in out:
+            out[ep.name] = ep  # loaded only when selected
+    return out
+
+
+def get_provider(name: str, options: dict[str, Any]) -> SimpleClient:
+    provider = providers()[name]
+    if isinstance(provider, importlib.metadata.EntryPoint):
+        provider = provider.load()
+    return provider.from_options(options)
+
+
+def classify_error(e: Exception) -> ErrorClass:
+    if isinstance(
+        e,
+        (
+            ipwhois.exceptions.HTTPRateLimitError,
+            ipwhois.exceptions.WhoisRateLimitError,
+        ),
+    ):
+        return ErrorClass.rate_limit
+
+    if isinstance(e, ipwhois.exceptions.HTTPLookupError):
+        # ipwhois only keeps the status code in the message
+        m = re.search(r"error code (\d+)", str(e))
+        if not m:
+            return ErrorClass.timeout  # socket error or timeout after ipwhois retries
+        if m.group(1).startswith("5"):
+            return ErrorClass.server_error
+        return ErrorClass.other
+
+    if isinstance(
+        e,
+        (
+            socket.timeout,
+            TimeoutError,
+            ipwhois.exceptions.WhoisLookupError,
+            ipwhois.exceptions.ASNLookupError,
+            ipwhois.exceptions.HostLookupError,
+        ),
+    ):
+        return ErrorClass.timeout
+
+    if isinstance(e, ipwhois.exceptions.ASNRegistryError):
+        return ErrorClass.server_error
+
+    if isinstance(
+        e,
+        (
+            json.JSONDecodeError,
+            ipwhois.exceptions.ASNParseError,
+            ipwhois.exceptions.InvalidNetworkObject,
+            ipwhois.exceptions.InvalidEntityObject,
+            ipwhois.exceptions.InvalidEntityContactObject,
+            KeyError,
+            IndexError,
+        ),
+    ):
+        return ErrorClass.parse_error
+
+    return ErrorClass.other
@@ -0,0 +1,88 @@
+import io
+import gzip
+import lzma
+
+from enum import Enum
+from typing import BinaryIO, TextIO
+
+BUFFER_SIZE = 1 << 20  # bytes, read and written per call to the codec
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+
+class Codec(Enum):
+    none = "none"
+    gzip = "gzip"
+    zstd = "zstd"
+    xz = "xz"
+
+    def __str__(self):
+        return self.value
+
+
+MAGIC = {
+    Codec.gzip: b"\x1f\x8b",
+    Codec.zstd: b"\x28\xb5\x2f\xfd",
+    Codec.xz: b"\xfd7zXZ\x00",
+}
+EXTENSIONS = {".gz": Codec.gzip, ".zst": Codec.zstd, ".xz": Codec.xz}
+
+
+def detect(f: io.BufferedReader) -> Codec:
+    start = f.peek(max(len(m) for m in MAGIC.values()))
+    for codec, magic in MAGIC.items():
+        if start.startswith(magic):
+            return codec
+    return Codec.none
+
+
+def codec_for(path: str) -> Codec:
+    for extension, codec in EXTENSIONS.items():
+        if path.endswith(extension):
+            return codec
+    return Codec.none
+
+
+def open_input(f: BinaryIO) -> TextIO:
+    # lines of f, decompressed while reading if f starts like a gzip, zstd or
+    # xz stream, so compressed lists need no zcat in front
+    if not isinstance(f, io.BufferedReader):
+        f = io.BufferedReader(f, buffer_size=BUFFER_SIZE)
+    codec = detect(f)
+    if codec == Codec.gzip:
+        stream = gzip.GzipFile(fileobj=f, mode="rb")
+    elif codec == Codec.xz:
+        stream = lzma.LZMAFile(f, mode="rb")
+    elif codec == Codec.zstd:
+        stream = zstandard().ZstdDecompressor().stream_reader(
+            f, read_size=BUFFER_SIZE, closefd=False
+        )
+    else:
+        return io.TextIOWrapper(f, encoding="utf-8", errors="replace")
+    stream = io.BufferedReader(stream, buffer_size=BUFFER_SIZE)
+    return io.TextIOWrapper(stream, encoding="utf-8", errors="replace")
+
+
+def open_output(path: str) -> TextIO:
+    # compressed by the extension of path; zstd compresses in as many threads
+    # as there are CPUs, gzip and xz in the calling thread
+    codec = codec_for(path)
+    if codec == Codec.gzip:
+        stream = gzip.GzipFile(path, mode="wb", compresslevel=GZIP_LEVEL)
+    elif codec == Codec.xz:
+        stream = lzma.LZMAFile(path, mode="wb")
+    elif codec == Codec.zstd:
+        compressor = zstandard().ZstdCompressor(level=ZSTD_LEVEL, threads=-1)
+        stream = compressor.stream_writer(open(path, "wb"), closefd=True)
+    else:
+        stream = open(path, "wb", buffering=0)
+    stream = io.BufferedWriter(stream, buffer_size=BUFFER_SIZE)
+    return io.TextIOWrapper(stream, encoding="utf-8")
+
+
+def zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise Exception("zstd support needs zstandard: pip install iprecon[zstd]")
+    return zstandard
@@ -0,0 +1,118 @@
+import asyncio
+import ipaddress
+import collections
+
+from typing import Optional
+
+from iprecon.log import info
+from iprecon.retry import ErrorClass
+
+WINDOW = 100  # latencies kept for the p95
+TOLERANCE = 1.5  # p95 may grow this much over the best one seen before backing off
+
+# errors that mean the upstream server wants less traffic
+OVERLOAD = {ErrorClass.rate_limit, ErrorClass.timeout}
+
+# IANA hands address space to the RIRs in IPv4 /8s and IPv6 blocks of /23
+# and larger, so all addresses of such a block are served by the same RIR
+REGISTRY_PREFIXLEN = {4: 8, 6: 23}
+
+
+class AIMDController:
+    # additive increase, multiplicative decrease: one more concurrent lookup
+    # after every round of lookups without errors and with a flat p95 latency,
+    # half as many after a rate limit or timeout
+    def __init__(self, name: str, maximum: int, minimum: int = 1, initial: int = 1):
+        self.name = name
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = max(minimum, min(initial, maximum))
+        self.latencies: collections.deque[float] = collections.deque(maxlen=WINDOW)
+        self.best_p95: Optional[float] = None
+        self._done = 0  # lookups finished in this round
+        self._errors = 0
+        self._cooldown = 0  # lookups started before the last decrease
+
+    def record(self, latency: float, error_class: Optional[ErrorClass] = None):
+        if error_class in OVERLOAD:
+            if self._cooldown > 0:
+                self._cooldown -= 1  # already backed off for this burst
+                return
+            self._set(max(self.minimum, self.limit // 2))
+            self._cooldown = self.limit
+            return
+
+        self._cooldown = max(0, self._cooldown - 1)
+        if error_class is not None:
+            self._errors += 1
+        else:
+            self.latencies.append(latency)
+        self._done += 1
+        if self._done < self.limit:
+            return
+
+        p95 = self.p95()
+        if p95 is not None:
+            if self.best_p95 is None or p95 < self.best_p95:
+                self.best_p95 = p95
+            flat = p95 <= self.best_p95 * TOLERANCE
+            if flat and self._errors == 0 and self.limit < self.maximum:
+                self._set(self.limit + 1)
+        self._done, self._errors = 0, 0
+
+    def p95(self) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def _set(self, limit: int):
+        if limit != self.limit:
+            info(
+                "concurrency for {upstream}: {old} -> {new}",
+                upstream=self.name,
+                old=self.limit,
+                new=limit,
+                event="concurrency",
+            )
+        self.limit = limit
+        self._done, self._errors = 0, 0
+        self.latencies.clear()  # latencies at the old limit say little
+
+
+class RegistryMap:
+    # which RIR answers for a block, learned from the asn_registry of earlier
+    # results, so the limit of a registry is known before the lookup
+    def __init__(self):
+        self._blocks: dict[tuple[int, int], str] = {}
+
+    def get(self, ip: str) -> str:
+        return self._blocks.get(block(ip), "unknown")
+
+    def learn(self, ip: str, registry: Optional[str]):
+        if registry:
+            self._blocks[block(ip)] = registry
+
+
+def block(ip: str) -> tuple[int, int]:
+    address = ipaddress.ip_address(ip)
+    bits = address.max_prefixlen - REGISTRY_PREFIXLEN[address.version]
+    return address.version, int(address) >> bits
+
+
+class AdaptiveLimit:
+    # like a semaphore, but the number of slots follows the controller
+    def __init__(self, controller: AIMDController):
+        self.controller = controller
+        self.in_flight = 0
+        self._released = asyncio.Event()
+
+    async def acquire(self):
+        while self.in_flight >= self.controller.limit:
+            self._released.clear()
+            await self._released.wait()
+        self.in_flight += 1
+
+    def release(self):
+        self.in_flight -= 1
+        self._released.set()
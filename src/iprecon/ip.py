@@ -25,14 +25,14 @@ class IPAddress:
 
     def asn(self) -> Optional[Network]:
         cidr = self.as_cidr()
-        if not cidr or not is_valid_cidr(cidr):
+        if not cidr:
             return None
 
         as_number = self.as_number()
         if not as_number:
             as_number = "?????"
 
-        return Network(
+        return get_network(
             cidrs=[cidr],
             name=f"asn-{as_number}",
             description=None,
@@ -42,46 +42,41 @@ class IPAddress:
         return len(self.rdap_info) > 0
 
     def networks(self) -> list[Network]:
-        if self.has_rdap_info():
-            return self._networks_rdap()
-        else:
-            return self._networks_whois()
+        networks = self._networks_rdap() if self.has_rdap_info() else []
+        if not networks:
+            networks = self._networks_whois()  # no-op if there is no WHOIS info
+        return networks
 
     def _networks_whois(self) -> list[Network]:
         nets = [net for net in self.whois_info.get("nets", [])]
 
         out = []
         for net in nets:
-            cidrs = [cidr.strip() for cidr in net.get("cidr", "").split(",")]
-            if are_valid_cidrs(cidrs):
-                out.append(
-                    Network(
-                        cidrs=cidrs,
-                        name=net.get("name"),
-                        description=net.get("description"),
-                    )
-                )
+            cidrs = [cidr.strip() for cidr in (net.get("cidr") or "").split(",")]
+            network = get_network(
+                cidrs=cidrs,
+                name=net.get("name"),
+                description=net.get("description"),
+            )
+            if network:
+                out.append(network)
 
         return out
 
     def _networks_rdap(self) -> list[Network]:
-        net = self.rdap_info.get("network", {})
-        cidrs = [cidr.strip() for cidr in net.get("cidr", "").split(",")]
-        if not are_valid_cidrs(cidrs):
-            return []
-
-        return [
-            Network(
-                cidrs=cidrs,
-                name=net.get("name"),
-                description=";".join(
-                    [
-                        f"{remark.get('title')}: {remark.get('description')}"
-                        for remark in (net.get("remarks") or [])
-                    ]
-                ),
-            )
-        ]
+        net = self.rdap_info.get("network") or {}
+        cidrs = [cidr.strip() for cidr in (net.get("cidr") or "").split(",")]
+        network = get_network(
+            cidrs=cidrs,
+            name=net.get("name"),
+            description=";".join(
+                [
+                    f"{remark.get('title')}: {remark.get('description')}"
+                    for remark in (net.get("remarks") or [])
+                ]
+            ),
+        )
+        return [network] if network else []
 
     def network(self) -> Optional[Network]:
         networks = self.networks()
@@ -102,6 +97,16 @@ class IPAddress:
         return str(self.ip)
 
 
+def get_network(
+    cidrs: list[str], name: Optional[str], description: Optional[str]
+) -> Optional[Network]:
+    # interned network, or None if any of the CIDRs is invalid
+    try:
+        return Network.get(cidrs=cidrs, name=name, description=description)
+    except ValueError:
+        return None
+
+
 def are_valid_cidrs(ss: list[str]) -> bool:
     for s in ss:
         if not is_valid_cidr(s):
@@ -128,3 +133,33 @@ def is_valid_ip(s: str) -> bool:
 
 def is_private_ip(s: str) -> bool:
     return ipaddress.ip_address(s).is_private
+
+
+def is_valid_range(s: str) -> bool:
+    try:
+        parse_range(s)
+        return True
+    except ValueError:
+        return False
+
+
+def parse_range(
+    s: str,
+) -> tuple[
+    Union[ipaddress.IPv4Address, ipaddress.IPv6Address],
+    Union[ipaddress.IPv4Address, ipaddress.IPv6Address],
+]:
+    # accepts "1.2.3.0/24" (host bits are ignored) or "1.2.3.4-1.2.3.10"
+    if "-" in s:
+        first, last = [ipaddress.ip_address(part.strip()) for part in s.split("-", 1)]
+        if first.version != last.version:
+            raise ValueError(f"{s} mixes IPv4 and IPv6")
+        if first > last:
+            raise ValueError(f"{s} ends before it starts")
+        return first, last
+
+    if "/" in s:
+        net = ipaddress.ip_network(s, strict=False)
+        return net.network_address, net.broadcast_address
+
+    raise ValueError(f"{s} is not a range")
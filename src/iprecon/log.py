@@ -1,7 +1,28 @@
 import sys
+import json
+import time
+import threading
 
+from enum import Enum
+from typing import Any, Optional, TextIO
+
+BURST = 10  # messages of one kind shown per interval, the rest is counted
+INTERVAL = 10  # seconds
 
 verbose = False
+log_file: Optional[TextIO] = None
+
+_lock = threading.Lock()
+_windows: dict[str, list] = {}  # kind -> [window start, shown, suppressed]
+
+
+class Level(Enum):
+    info = "info"
+    warning = "warning"
+    error = "error"
+
+    def __str__(self):
+        return self.value
 
 
 def set_verbose():
@@ -9,6 +30,84 @@ def set_verbose():
     verbose = True
 
 
-def error(msg: str):
-    if verbose:
-        print(f"[!] {msg}", file=sys.stderr)
+def set_log_file(f: Optional[TextIO]):
+    global log_file
+    log_file = f
+
+
+def info(msg: str, *args: Any, event: Optional[str] = None, **fields: Any):
+    if verbose or log_file:
+        log(Level.info, msg, args, event, fields)
+
+
+def error(msg: str, *args: Any, event: Optional[str] = None, **fields: Any):
+    # messages are templates, formatted only if they are shown:
+    # error("{ip} is not a valid IP address", ip=s, event="invalid-ip")
+    if verbose or log_file:
+        log(Level.error, msg, args, event, fields)
+
+
+def warning(msg: str, *args: Any, event: Optional[str] = None, **fields: Any):
+    log(Level.warning, msg, args, event, fields)  # shown even without verbose
+
+
+def log(
+    level: Level,
+    msg: str,
+    args: tuple = (),
+    event: Optional[str] = None,
+    fields: Optional[dict] = None,
+):
+    kind = event or msg
+    now = time.monotonic()
+    with _lock:
+        window = _windows.get(kind)
+        if window is None:
+            window = _windows[kind] = [now, 0, 0]
+        elif now - window[0] >= INTERVAL:
+            if window[2]:
+                _suppressed(level, kind, window[2])
+            window[0], window[1], window[2] = now, 0, 0
+
+        if window[1] >= BURST:
+            window[2] += 1
+            return
+        window[1] += 1
+
+        text = msg.format(*args, **fields) if args or fields else msg
+        _emit(level, text, event, fields)
+
+
+def close_log():
+    # reports what was suppressed since the last message of each kind
+    with _lock:
+        for kind, window in _windows.items():
+            if window[2]:
+                _suppressed(Level.error, kind, window[2])
+        _windows.clear()
+        if log_file:
+            log_file.flush()
+
+
+def _suppressed(level: Level, kind: str, n: int):
+    text = f"{human(n)} more '{kind}' messages suppressed"
+    _emit(level, text, "suppressed", {"kind": kind, "count": n})
+
+
+def _emit(level: Level, text: str, event: Optional[str], fields: Optional[dict]):
+    if verbose or level == Level.warning:
+        print(f"[!] {text}", file=sys.stderr)
+    if log_file:
+        record = {"time": time.time(), "level": str(level), "message": text}
+        if event:
+            record["event"] = event
+        record.update(fields or {})
+        print(json.dumps(record, default=str), file=log_file)
+
+
+def human(n: int) -> str:
+    # 1234567 -> "1.2M"
+    for unit, size in (("G", 10**9), ("M", 10**6), ("k", 10**3)):
+        if n >= size:
+            return f"{n / size:.1f}{unit}"
+    return str(n)
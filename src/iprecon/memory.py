@@ -0,0 +1,95 @@
+import os
+import re
+import linecache
+import tracemalloc
+
+from typing import Callable, Optional
+
+HIGH_WATER = 0.8  # start shrinking at this fraction of the budget
+REGROWTH = 0.1  # fraction of the budget usage must grow by to shrink again
+
+UNITS = {"": 1, "k": 1 << 10, "m": 1 << 20, "g": 1 << 30, "t": 1 << 40}
+
+
+def parse_size(s: str) -> int:
+    # "512M", "2g", "1048576"
+    m = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([kmgt]?)i?b?\s*", s.lower())
+    if not m:
+        raise ValueError(f"{s} is not a valid size")
+    return int(float(m.group(1)) * UNITS[m.group(2)])
+
+
+def current_memory() -> Optional[int]:
+    # resident set size in bytes, None where it cannot be determined
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+
+    if tracemalloc.is_tracing():
+        return tracemalloc.get_traced_memory()[0]
+    return None
+
+
+class MemoryBudget:
+    def __init__(
+        self, limit: int, usage: Callable[[], Optional[int]] = current_memory
+    ):
+        self.limit = limit
+        self.usage = usage
+        self._shrunk_at: Optional[int] = None
+
+    def exceeded(self) -> bool:
+        used = self.usage()
+        return used is not None and used > self.limit * HIGH_WATER
+
+    def should_shrink(self) -> bool:
+        # RSS rarely drops after objects are freed, so above the high water
+        # mark only shrink again once usage has grown since the last time
+        used = self.usage()
+        if used is None or used <= self.limit * HIGH_WATER:
+            self._shrunk_at = None
+            return False
+        if self._shrunk_at is not None:
+            if used < self._shrunk_at + self.limit * REGROWTH:
+                return False
+        self._shrunk_at = used
+        return True
+
+
+class MemoryProfiler:
+    # tracemalloc snapshots taken whenever a pipeline stage finishes
+    def __init__(self, top: int = 10):
+        self.top = top
+        self.snapshots: list[tuple[str, tracemalloc.Snapshot]] = []
+
+    def start(self):
+        tracemalloc.start()
+        self.snapshot("start")
+
+    def snapshot(self, label: str):
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, linecache.__file__),
+            ]
+        )
+        self.snapshots.append((label, snapshot))
+
+    def report(self) -> list[str]:
+        if not self.snapshots:
+            return []
+
+        current, peak = tracemalloc.get_traced_memory()
+        out = [f"memory: current {current >> 10} KiB, peak {peak >> 10} KiB"]
+
+        for (_, before), (label, after) in zip(self.snapshots, self.snapshots[1:]):
+            diff = after.compare_to(before, "lineno")[: min(self.top, 3)]
+            out.append(f"growth until '{label}' finished:")
+            out += [f"  {stat}" for stat in diff]
+
+        label, last = self.snapshots[-1]
+        out.append(f"top allocators at '{label}':")
+        out += [f"  {stat}" for stat in last.statistics("lineno")[: self.top]]
+        return out
@@ -0,0 +1,133 @@
+from __future__ import annotations
+import os
+import bisect
+import tempfile
+import threading
+
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from iprecon.pipeline import Pipeline
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+BATCH_BUCKETS = (1, 5, 10, 30, 60, 120, 300, 600)
+
+# pipeline counters exported as lookup outcomes
+OUTCOMES = {
+    "resolved": "resolved",
+    "retried": "retried",
+    "failed": "failed",
+    "skipped": "skipped",
+    "duplicates": "duplicate",
+    "fresh": "fresh",
+}
+
+
+class Histogram:
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last one is +Inf
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def lines(self, name: str, labels: str) -> list[str]:
+        out, total = [], 0
+        bounds = [str(float(b)) for b in self.buckets] + ["+Inf"]
+        for bound, count in zip(bounds, self.counts):
+            total += count
+            out.append(f'{name}_bucket{{{labels},le="{bound}"}} {total}')
+        out.append(f"{name}_count{{{labels}}} {total}")
+        out.append(f"{name}_sum{{{labels}}} {self.sum}")
+        return out
+
+
+class Metrics:
+    # counters are read from the pipeline when rendering, so every scrape or
+    # textfile write sees the current state of the running job
+    def __init__(self, method: str, format: str, textfile: Optional[str] = None):
+        self.method = method
+        self.format = format
+        self.textfile = textfile
+        self.latency: dict[str, Histogram] = defaultdict(Histogram)
+        self.batch_latency = Histogram(BATCH_BUCKETS)
+        self.pipeline: Optional[Pipeline] = None
+
+    def observe_lookup(self, registry: str, seconds: float):
+        self.latency[registry].observe(seconds)
+
+    def observe_batch(self, seconds: float):
+        self.batch_latency.observe(seconds)
+
+    def render(self) -> str:
+        method = f'method="{self.method}"'
+        out = []
+
+        if self.pipeline:
+            counters = self.pipeline.counters
+            out.append("# TYPE iprecon_lookups counter")
+            for counter, outcome in OUTCOMES.items():
+                out.append(
+                    f'iprecon_lookups_total{{{method},outcome="{outcome}"}} '
+                    f"{counters[counter]}"
+                )
+            out.append("# TYPE iprecon_rows_written counter")
+            out.append(
+                f'iprecon_rows_written_total{{format="{self.format}"}} '
+                f'{counters["written"]}'
+            )
+            out.append("# TYPE iprecon_queue_depth gauge")
+            for queue, depth in self.pipeline.queue_depths().items():
+                out.append(f'iprecon_queue_depth{{queue="{queue}"}} {depth}')
+            out.append("# TYPE iprecon_retry_queue_depth gauge")
+            out.append(f"iprecon_retry_queue_depth {len(self.pipeline.retries)}")
+            out.append("# TYPE iprecon_concurrency_limit gauge")
+            for upstream, limit in self.pipeline.concurrency_limits().items():
+                labels = f'upstream="{upstream}"'
+                out.append(f"iprecon_concurrency_limit{{{labels}}} {limit}")
+
+        out.append("# TYPE iprecon_lookup_duration_seconds histogram")
+        for registry, histogram in sorted(self.latency.items()):
+            labels = f'{method},registry="{registry}"'
+            out += histogram.lines("iprecon_lookup_duration_seconds", labels)
+        out.append("# TYPE iprecon_batch_duration_seconds histogram")
+        out += self.batch_latency.lines("iprecon_batch_duration_seconds", method)
+
+        out.append("# EOF")
+        return "\n".join(out) + "\n"
+
+    def flush(self):
+        # atomic replace, so node_exporter's textfile collector never reads
+        # a half-written file
+        if not self.textfile:
+            return
+        directory = os.path.dirname(os.path.abspath(self.textfile))
+        with tempfile.NamedTemporaryFile("w", dir=directory, delete=False) as f:
+            f.write(self.render())
+        os.replace(f.name, self.textfile)
+
+
+def serve_metrics(metrics: Metrics, port: int, host: str = "") -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass  # keep stderr for iprecon's own messages
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
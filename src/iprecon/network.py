@@ -1,19 +1,48 @@
 from __future__ import annotations
 import re
+import weakref
 import ipaddress
+import collections
 
 from typing import Optional, Union, Any
 
 from iprecon.utils import clean, truncate
 
+RECENT_NETWORKS = 1024  # kept alive after their last row, for the next rows
+
 
 class Network:
+    # shared instances by (cidrs, name, description); the most recently used
+    # are held in _recent, the rest are dropped once unused
+    _interned: weakref.WeakValueDictionary = weakref.WeakValueDictionary()
+    _recent: collections.OrderedDict = collections.OrderedDict()
+
+    @classmethod
+    def get(
+        cls, cidrs: list[str], name: Optional[str], description: Optional[str]
+    ) -> Network:
+        key = (tuple(cidrs), name, description)
+        network = cls._recent.get(key)
+        if network is not None:
+            cls._recent.move_to_end(key)
+            return network
+
+        network = cls._interned.get(key)
+        if network is None:
+            network = cls(cidrs=cidrs, name=name, description=description)
+            cls._interned[key] = network
+        cls._recent[key] = network
+        if len(cls._recent) > RECENT_NETWORKS:
+            cls._recent.popitem(last=False)
+        return network
+
     def __init__(
         self, cidrs: list[str], name: Optional[str], description: Optional[str]
     ):
         self.cidrs = [ipaddress.ip_network(cidr) for cidr in cidrs]
         self.name = name
         self.description = description
+        self._strings: dict[int, str] = {}  # max_len -> formatted string
 
     def shortname(self, max_len: int) -> str:
         return truncate(clean(self.name or self.description or "???"), max_len)
@@ -34,8 +63,12 @@ class Network:
         return False
 
     def string(self, max_len: int) -> str:
-        prefix = f"{'-'.join([ str(cidr) for cidr in self.cidrs ])}["
-        return prefix + self.shortname(max_len - len(prefix) - 1) + "]"
+        s = self._strings.get(max_len)
+        if s is None:
+            prefix = f"{'-'.join([ str(cidr) for cidr in self.cidrs ])}["
+            s = prefix + self.shortname(max_len - len(prefix) - 1) + "]"
+            self._strings[max_len] = s
+        return s
 
     def __str__(self) -> str:
         return self.string(0)
@@ -13,6 +13,12 @@ class Writer(metaclass=abc.ABCMeta):
     def write(self, ip: IPAddress):
         raise NotImplementedError
 
+    def close(self):
+        pass
+
+    def shrink(self):
+        pass  # called when memory runs low, release what can be released
+
 
 class TextWriter(Writer):
     def __init__(self):
@@ -30,29 +36,30 @@ class TextWriter(Writer):
             2: max_asn_size,
             3: max_net_size,
         }
+        self._row = row_format(self.col_size, margin=" ").format
         self._print("IP", "ASN", "Network")
         self._print(
             max_ip_size * "-", max_asn_size * "-", max_net_size * "-", margin="-"
         )
 
     def _print(self, col1: str, col2: str, col3: str, margin: str = " "):
-        col1 = right_justify(col1, self.col_size[1])
-        col2 = right_justify(col2, self.col_size[2])
-        col3 = left_justify(col3, self.col_size[3])
-        print(f"|{col1}{margin}|{margin}{col2}{margin}|{margin}{col3}|")
+        if margin == " ":
+            print(self._row(col1, col2, col3))
+        else:
+            print(row_format(self.col_size, margin=margin).format(col1, col2, col3))
 
     def write(self, ip):
         network = ip.network()
         net = network.string(max_len=self.col_size[3]) if network else "???"
-        self._print(str(ip), str(ip.as_number() or "???"), net)
-
+        print(self._row(str(ip), str(ip.as_number() or "???"), net))
 
-def right_justify(s: str, n: int) -> str:
-    return f"{{0:>{n}s}}".format(s)
 
-
-def left_justify(s: str, n: int) -> str:
-    return f"{{0:<{n}s}}".format(s)
+def row_format(col_size: dict[int, int], margin: str) -> str:
+    # built once per writer so rows are formatted without per-call format strings
+    return (
+        f"|{{0:>{col_size[1]}s}}{margin}|{margin}{{1:>{col_size[2]}s}}{margin}"
+        f"|{margin}{{2:<{col_size[3]}s}}|"
+    )
 
 
 class CSVWriter(Writer):
@@ -79,24 +86,24 @@ class CSVWriter(Writer):
 
 class JSONWriter(Writer):
     def write(self, ip):
-        all_networks = sorted(ip.networks(), key=lambda network: network.size())
-        print(
-            json.dumps(
-                {
-                    "ip": str(ip),
-                    "asn": str(ip.as_number()),
-                    "asn_cidr": str(ip.as_cidr()),
-                    "networks": [
-                        {
-                            "cidr": "-".join(str(cidr) for cidr in net.cidrs),
-                            "name": str(net.name),
-                            "description": str(net.description),
-                        }
-                        for net in all_networks
-                    ],
-                }
-            )
-        )
+        print(json.dumps(json_record(ip)))
+
+
+def json_record(ip: IPAddress) -> dict:
+    all_networks = sorted(ip.networks(), key=lambda network: network.size())
+    return {
+        "ip": str(ip),
+        "asn": str(ip.as_number()),
+        "asn_cidr": str(ip.as_cidr()),
+        "networks": [
+            {
+                "cidr": "-".join(str(cidr) for cidr in net.cidrs),
+                "name": str(net.name),
+                "description": str(net.description),
+            }
+            for net in all_networks
+        ],
+    }
 
 
 class OutputFormat(Enum):
@@ -0,0 +1,134 @@
+import ast
+import sys
+import mmap
+import array
+import struct
+import ipaddress
+
+from typing import BinaryIO, Iterable, Iterator, Union
+
+from iprecon.log import error
+from iprecon.utils import clean
+
+Address = Union[ipaddress.IPv4Address, ipaddress.IPv6Address]
+
+# packed lists: "IPRB", version, bytes per address (4 or 16), then the
+# addresses big-endian; IPv4 in 16 byte files is stored IPv4-mapped
+MAGIC = b"IPRB"
+HEADER = struct.Struct(">4sBB2x")
+VERSION = 1
+NPY_MAGIC = b"\x93NUMPY"
+CHUNK = 4096  # addresses unpacked at once
+IPV4_MAPPED = 0xFFFF << 32
+
+
+class PackedInput:
+    # iterates over addresses in a packed list or .npy file through an mmap,
+    # unpacking a chunk at a time instead of parsing text line by line
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        self.name = path
+
+        if self._view[: len(MAGIC)] == MAGIC:
+            _, version, width = HEADER.unpack_from(self._view)
+            if version != VERSION or width not in (4, 16):
+                raise ValueError(f"{path}: unsupported packed list")
+            self.offset, self.width, self.order = HEADER.size, width, ">"
+        elif self._view[: len(NPY_MAGIC)] == NPY_MAGIC:
+            self.offset, self.width, self.order = npy_header(self._view, path)
+        else:
+            raise ValueError(f"{path} is not a packed IP list")
+
+        self.count = (len(self._view) - self.offset) // self.width
+        self._addresses = self._read_all()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __iter__(self) -> Iterator[Address]:
+        return self._addresses  # continues where the last iteration stopped
+
+    def _read_all(self) -> Iterator[Address]:
+        for start in range(0, self.count, CHUNK):
+            yield from self.read(start, min(CHUNK, self.count - start))
+
+    def read(self, start: int, n: int) -> list[Address]:
+        offset = self.offset + start * self.width
+        if self.width == 4:
+            ints = struct.unpack_from(f"{self.order}{n}I", self._view, offset)
+            return [ipaddress.IPv4Address(i) for i in ints]
+
+        # 16 bytes are two 64 bit halves, high one first
+        halves = struct.unpack_from(f"{self.order}{2 * n}Q", self._view, offset)
+        out = []
+        for hi, lo in zip(halves[::2], halves[1::2]):
+            ip = ipaddress.IPv6Address(hi << 64 | lo)
+            out.append(ip.ipv4_mapped or ip)
+        return out
+
+    def close(self):
+        self._view.release()
+        self._mmap.close()
+
+
+def npy_header(view: memoryview, path: str) -> tuple[int, int, str]:
+    # .npy: magic, version, header length, then a dict literal like
+    # {'descr': '<u4', 'fortran_order': False, 'shape': (1000,)}
+    major = view[6]
+    if major == 1:
+        (length,), start = struct.unpack_from("<H", view, 8), 10
+    else:
+        (length,), start = struct.unpack_from("<I", view, 8), 12
+    header = ast.literal_eval(bytes(view[start : start + length]).decode("latin1"))
+
+    descr, shape = header["descr"], header["shape"]
+    order = "<" if descr[0] in "<|" else ">"
+    if header["fortran_order"] and len(shape) > 1:
+        raise ValueError(f"{path}: Fortran-ordered arrays are not supported")
+    if descr[1:] == "u4" and len(shape) == 1:
+        return start + length, 4, order
+    if descr[1:] == "u8" and len(shape) == 2 and shape[1] == 2:
+        return start + length, 16, order  # rows of (high, low) halves
+    raise ValueError(f"{path}: expected uint32 or (n, 2) uint64 array, not {descr}")
+
+
+def is_packed(path: str) -> bool:
+    try:
+        with open(path, "rb") as f:
+            start = f.read(len(NPY_MAGIC))
+    except OSError:
+        return False
+    return start.startswith(MAGIC) or start == NPY_MAGIC
+
+
+def pack(lines: Iterable[str], out: BinaryIO) -> int:
+    # 4 bytes per address if there are only IPv4 addresses, 16 otherwise;
+    # addresses keep the order of the lines
+    v4, wide = array.array("I"), None  # wide from the first IPv6 address on
+    for line in lines:
+        s = clean(line)
+        try:
+            ip = ipaddress.ip_address(s)
+        except ValueError:
+            error("{ip} is not a valid IP address", ip=s, event="invalid-ip")
+            continue
+        if wide is None and ip.version == 4:
+            v4.append(int(ip))
+            continue
+        if wide is None:
+            wide, v4 = [IPV4_MAPPED | i for i in v4], None
+        wide.append(int(ip) if ip.version == 6 else IPV4_MAPPED | int(ip))
+
+    if wide is None:
+        out.write(HEADER.pack(MAGIC, VERSION, 4))
+        if sys.byteorder == "little":
+            v4.byteswap()
+        v4.tofile(out)
+        return len(v4)
+
+    out.write(HEADER.pack(MAGIC, VERSION, 16))
+    for i in wide:
+        out.write(i.to_bytes(16, "big"))
+    return len(wide)
@@ -0,0 +1,540 @@
+from __future__ import annotations
+import gc
+import time
+import asyncio
+import itertools
+import ipaddress
+import signal
+
+from iprecon.aggregate import AggregateKey, aggregate_key
+from iprecon.baseline import Baseline
+from iprecon.concurrency import AdaptiveLimit, AIMDController
+from iprecon.log import error, info, warning
+from iprecon.memory import MemoryBudget, MemoryProfiler
+from iprecon.metrics import Metrics
+from iprecon.ip import IPAddress, is_valid_range, parse_range
+from iprecon.output import Writer
+from iprecon.packed import Address, PackedInput
+from iprecon.ranges import walk_range
+from iprecon.retry import ErrorClass, RetryQueue
+from iprecon.special import SkipTable
+from iprecon.utils import clean
+
+from typing import Any, Optional, TextIO, Union, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from iprecon.client import SimpleClient
+
+READ_CHUNK = 1000  # lines read per trip to the reader thread
+MEMORY_CHECK_INTERVAL = 1  # seconds between checks of the memory budget
+MIN_BATCH_SIZE = 10
+METRICS_INTERVAL = 15  # seconds between writes of the metrics textfile
+
+# an input item is either a single IP (as string) or a range as (first, last)
+Item = Union[
+    str,
+    tuple[
+        Union[ipaddress.IPv4Address, ipaddress.IPv6Address],
+        Union[ipaddress.IPv4Address, ipaddress.IPv6Address],
+    ],
+]
+
+
+class Pipeline:
+    def __init__(
+        self,
+        client: SimpleClient,
+        output: Writer,
+        expand_ranges: bool = False,
+        queue_size: int = 1000,
+        batch_size: int = 1000,
+        concurrency: int = 1,
+        adaptive: bool = False,
+        stats_interval: float = 0,
+        retries: Optional[RetryQueue] = None,
+        failed_output: Optional[TextIO] = None,
+        skip: Optional[SkipTable] = None,
+        memory: Optional[MemoryBudget] = None,
+        profiler: Optional[MemoryProfiler] = None,
+        metrics: Optional[Metrics] = None,
+        baseline: Optional[Baseline] = None,
+    ):
+        self.client = client
+        self.output = output
+        self.bulk = client.supports_batching
+        self.concurrency = max(1, min(concurrency, client.concurrency_limit))
+        # adaptive: self.concurrency is only the upper bound, per upstream
+        # server a controller decides how many lookups run at the same time
+        self.adaptive = adaptive
+        self.limits: dict[str, Union[asyncio.Semaphore, AdaptiveLimit]] = {}
+        self.expand_ranges = expand_ranges
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.stats_interval = stats_interval
+        # without a retry queue, every error is final
+        if retries is None:
+            retries = RetryQueue(classify=lambda e: ErrorClass.other)
+        self.retries = retries
+        self.failed_output = failed_output
+        self.skip = skip or SkipTable.default()
+        self.memory = memory
+        self.profiler = profiler
+        self.metrics = metrics
+        self.baseline = baseline
+        if metrics:
+            metrics.pipeline = self
+
+        self.queues: dict[str, asyncio.Queue] = {}
+        self.counters = {
+            "read": 0,
+            "skipped": 0,
+            "duplicates": 0,
+            "fresh": 0,
+            "resolved": 0,
+            "retried": 0,
+            "failed": 0,
+            "written": 0,
+            "shrinks": 0,
+        }
+        self.interrupted = False
+        self._tasks: list[asyncio.Task] = []
+        self._in_flight = 0
+        self._seen: set[Item] = set()
+        self._idle: Optional[asyncio.Event] = None
+
+    def run(self, input: Union[TextIO, PackedInput]):
+        asyncio.run(self._run(input))
+
+    def stop(self):
+        self.interrupted = True
+        for task in self._tasks:
+            task.cancel()
+
+    def queue_depths(self) -> dict[str, int]:
+        return {name: q.qsize() for name, q in self.queues.items()}
+
+    def stats(self) -> str:
+        counters = " ".join(f"{k}={v}" for k, v in self.counters.items())
+        depths = " ".join(f"{k}={v}" for k, v in self.queue_depths().items())
+        out = f"{counters} | queues: {depths} retry={len(self.retries)}"
+        if self.adaptive:
+            limits = " ".join(f"{k}={v}" for k, v in self.concurrency_limits().items())
+            out += f" | concurrency: {limits}"
+        return out
+
+    def concurrency_limits(self) -> dict[str, int]:
+        return {
+            name: limit.controller.limit
+            for name, limit in self.limits.items()
+            if isinstance(limit, AdaptiveLimit)
+        }
+
+    async def _run(self, input: Union[TextIO, PackedInput]):
+        self._idle = asyncio.Event()
+        self.queues = {
+            name: asyncio.Queue(maxsize=self.queue_size)
+            for name in ["lines", "valid", "unique", "results"]
+        }
+        stages = {
+            "read": self._read(input),
+            "validate": self._validate(),
+            "dedup": self._dedup(),
+            "resolve": self._resolve_bulk() if self.bulk else self._resolve(),
+            "write": self._write(),
+        }
+        self._tasks = [
+            asyncio.create_task(self._stage(name, stage))
+            for name, stage in stages.items()
+        ]
+
+        background = []
+        if self.stats_interval > 0:
+            background.append(asyncio.create_task(self._monitor()))
+        if self.memory:
+            background.append(asyncio.create_task(self._watch_memory()))
+        if self.metrics and self.metrics.textfile:
+            background.append(asyncio.create_task(self._export_metrics()))
+
+        loop = asyncio.get_running_loop()
+        try:
+            loop.add_signal_handler(signal.SIGINT, self.stop)
+        except (NotImplementedError, RuntimeError):
+            pass  # not supported on this platform, Ctrl+C raises as usual
+
+        try:
+            await asyncio.gather(*self._tasks)
+        except asyncio.CancelledError:
+            if not self.interrupted:
+                raise
+            info("interrupted, stopped all stages")
+        finally:
+            try:
+                loop.remove_signal_handler(signal.SIGINT)
+            except (NotImplementedError, RuntimeError):
+                pass
+            for task in self._tasks + background:
+                task.cancel()
+            await asyncio.gather(*self._tasks, *background, return_exceptions=True)
+            await asyncio.to_thread(self.client.close)
+            self.output.close()
+            if self.profiler:
+                self.profiler.snapshot("close")
+            self._report_failures()
+            if self.metrics:
+                self.metrics.flush()
+            if self.stats_interval > 0:
+                info(self.stats(), event="stats")
+
+    async def _stage(self, name: str, stage):
+        await stage
+        if self.profiler:
+            self.profiler.snapshot(name)
+
+    async def _watch_memory(self):
+        while True:
+            await asyncio.sleep(MEMORY_CHECK_INTERVAL)
+            if self.memory.should_shrink():
+                self.shrink()
+
+    def shrink(self):
+        # trade speed for memory: smaller batches, forget seen IPs (duplicates
+        # may be looked up again) and let the writer spill to disk
+        self.batch_size = max(MIN_BATCH_SIZE, self.batch_size // 2)
+        self._seen.clear()
+        self.output.shrink()
+        gc.collect()
+        self.counters["shrinks"] += 1
+        info(
+            "memory budget reached, batch size now {n}",
+            n=self.batch_size,
+            event="memory",
+        )
+
+    async def _export_metrics(self):
+        while True:
+            await asyncio.sleep(METRICS_INTERVAL)
+            await asyncio.to_thread(self.metrics.flush)
+
+    async def _monitor(self):
+        while True:
+            await asyncio.sleep(self.stats_interval)
+            info(self.stats(), event="stats")
+
+    async def _read(self, input: Union[TextIO, PackedInput]):
+        out = self.queues["lines"]
+        while True:
+            lines = await asyncio.to_thread(read_lines, input, READ_CHUNK)
+            if not lines:
+                break
+            for line in lines:
+                self.counters["read"] += 1
+                await out.put(line)
+        await out.put(None)
+
+    async def _validate(self):
+        inp, out = self.queues["lines"], self.queues["valid"]
+        while (line := await inp.get()) is not None:
+            item = self._validate_line(line)
+            if item is None:
+                self.counters["skipped"] += 1
+                continue
+            await out.put(item)
+        await out.put(None)
+
+    def _validate_line(self, line: Union[str, Address]) -> Optional[Item]:
+        if not isinstance(line, str):
+            # from a packed list, already parsed
+            if self.skip.contains(line):
+                error(
+                    "{ip} is a private or reserved IP address",
+                    ip=line,
+                    event="skipped-ip",
+                )
+                return None
+            return str(line)
+
+        s = clean(line)
+        if is_valid_range(s):
+            first, last = parse_range(s)
+            if self.skip.covers(first, last):
+                error(
+                    "{ip} is a private or reserved IP range", ip=s, event="skipped-ip"
+                )
+                return None
+            return first, last
+
+        if skip_input(s, self.skip):
+            return None
+
+        return s
+
+    async def _dedup(self):
+        inp, out = self.queues["valid"], self.queues["unique"]
+        while (item := await inp.get()) is not None:
+            if item in self._seen:
+                self.counters["duplicates"] += 1
+                continue
+            self._seen.add(item)
+            if isinstance(item, str) and self._fresh(item):
+                self.counters["fresh"] += 1  # checked recently, not looked up
+                continue
+            await out.put(item)
+        await out.put(None)
+
+    def _fresh(self, ip: str) -> bool:
+        # an empty baseline is falsy, on the first run it is still a baseline
+        return self.baseline is not None and self.baseline.fresh(ip)
+
+    async def _resolve(self):
+        # up to self.concurrency lookups run at the same time; adaptive, every
+        # upstream server gets its own lane, so a server at its limit only
+        # holds back its own lookups
+        lanes: dict[str, asyncio.Queue] = {}
+        workers: list[asyncio.Task] = []
+        try:
+            async for item, attempt in self._items():
+                self._in_flight += 1  # until looked up, for _items to wait on
+                upstream = self._upstream(item)
+                if upstream not in lanes:
+                    lanes[upstream] = asyncio.Queue(maxsize=self.queue_size)
+                    lane = self._lane(upstream, lanes[upstream])
+                    workers.append(asyncio.create_task(lane))
+                await lanes[upstream].put((item, attempt))
+            for lane in lanes.values():
+                await lane.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+        await self.queues["results"].put(None)
+
+    async def _lane(self, upstream: str, lane: asyncio.Queue):
+        limit = self._limit(upstream)
+        pending: set[asyncio.Task] = set()
+        try:
+            while (entry := await lane.get()) is not None:
+                item, attempt = entry
+                await limit.acquire()
+                task = asyncio.create_task(self._resolve_one(item, attempt, limit))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+            await asyncio.gather(*pending)
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def _upstream(self, item: Item) -> str:
+        if not self.adaptive:
+            return ""
+        return self.client.upstream(str(item[0]) if isinstance(item, tuple) else item)
+
+    def _limit(self, upstream: str) -> Union[asyncio.Semaphore, AdaptiveLimit]:
+        if upstream not in self.limits:
+            if self.adaptive:
+                controller = AIMDController(upstream, maximum=self.concurrency)
+                self.limits[upstream] = AdaptiveLimit(controller)
+            else:
+                self.limits[upstream] = asyncio.Semaphore(self.concurrency)
+        return self.limits[upstream]
+
+    async def _resolve_one(self, item: Item, attempt: int, limit: asyncio.Semaphore):
+        try:
+            if isinstance(item, tuple):
+                await self._resolve_range(item, attempt, limit)
+                return
+
+            start = time.perf_counter()
+            try:
+                ip = await asyncio.to_thread(self.client.get, item)
+            except Exception as e:
+                self._observe(None, start, limit, e)
+                self._failed(item, attempt, e)
+                return
+            self._observe(ip, start, limit)
+            self.counters["resolved"] += 1
+            await self.queues["results"].put(ip)
+        finally:
+            limit.release()
+            self._in_flight -= 1
+            self._idle.set()
+
+    async def _items(self):
+        # yields (item, attempt) from the input queue, interleaved with
+        # retries as soon as they are due, and drains retries at the end
+        inp = self.queues["unique"]
+        done = False
+        while True:
+            due = self.retries.pop_due()
+            if due:
+                yield due
+                continue
+
+            if done:
+                if len(self.retries) == 0 and self._in_flight == 0:
+                    return
+                # wait for the next retry, or for a lookup in flight that
+                # might still fail and schedule one
+                self._idle.clear()
+                try:
+                    await asyncio.wait_for(self._idle.wait(), self.retries.next_due())
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                item = await asyncio.wait_for(inp.get(), self.retries.next_due())
+            except asyncio.TimeoutError:
+                continue  # a retry is due
+
+            if item is None:
+                done = True
+                continue
+            yield item, 1
+
+    async def _resolve_range(self, item: Item, attempt: int, limit: Any = None):
+        out = self.queues["results"]
+        first, last = item
+        ranges = walk_range(self.client, first, last)
+        try:
+            start = time.perf_counter()
+            while (r := await asyncio.to_thread(next, ranges, None)) is not None:
+                self._observe(r, start, limit)
+                self.counters["resolved"] += 1
+                if self.expand_ranges:
+                    for ip in r.expand():
+                        await out.put(ip)
+                else:
+                    await out.put(r)
+
+                if r.last < last:
+                    first, attempt = type(first)(int(r.last) + 1), 1
+                start = time.perf_counter()
+        except Exception as e:
+            self._observe(None, start, limit, e)
+            self._failed((first, last), attempt, e)  # retry only what is left
+
+    async def _resolve_bulk(self):
+        batch = []
+        async for item, attempt in self._items():
+            if isinstance(item, list):
+                await self._resolve_batch(item, attempt)  # a retried batch
+                continue
+            if isinstance(item, tuple):
+                # ranges are walked one allocation at a time with client.get
+                await self._resolve_range(item, attempt)
+                continue
+
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                await self._resolve_batch(batch, 1)
+                batch = []
+            if self.queues["unique"].empty() and len(self.retries) > 0:
+                # do not hold back a partial batch while waiting for retries
+                await self._resolve_batch(batch, 1)
+                batch = []
+        if batch:
+            await self._resolve_batch(batch, 1)
+        await self.queues["results"].put(None)
+
+    async def _resolve_batch(self, batch: list[str], attempt: int):
+        if not batch:
+            return
+
+        out = self.queues["results"]
+        found = set()
+        start = time.perf_counter()
+        try:
+            async for ip in self.client.get_many(batch):
+                self.counters["resolved"] += 1
+                found.add(str(ip))
+                await out.put(ip)
+        except Exception as e:
+            if self.metrics:
+                self.metrics.observe_batch(time.perf_counter() - start)
+            self._failed([s for s in batch if s not in found], attempt, e)
+            return
+
+        if self.metrics:
+            self.metrics.observe_batch(time.perf_counter() - start)
+
+        missing = [s for s in batch if s not in found]
+        if missing:
+            error("No result for {n} IPs of batch", n=len(missing), event="missing")
+            self.counters["failed"] += len(missing)
+            for s in missing:
+                self.retries.fail(s, ErrorClass.other)
+
+    def _observe(
+        self,
+        ip: Optional[IPAddress],
+        start: float,
+        limit: Any = None,
+        e: Optional[Exception] = None,
+    ):
+        elapsed = time.perf_counter() - start
+        if isinstance(limit, AdaptiveLimit):
+            limit.controller.record(elapsed, self.retries.classify(e) if e else None)
+        if self.metrics:
+            registry = aggregate_key(AggregateKey.registry, ip) if ip else "???"
+            self.metrics.observe_lookup(registry, elapsed)
+
+    def _failed(self, item: Any, attempt: int, e: Exception):
+        if self.retries.add(item, e, attempt):
+            self.counters["retried"] += 1
+            error(
+                "Error for {item} (attempt {attempt}), will retry: {e}",
+                item=format_item(item),
+                attempt=attempt,
+                e=e,
+                event="lookup-retry",
+            )
+            return
+
+        self.counters["failed"] += len(item) if isinstance(item, list) else 1
+        error(
+            "Error for {item}: {e}", item=format_item(item), e=e, event="lookup-error"
+        )
+
+    def _report_failures(self):
+        for error_class, items in self.retries.failed.items():
+            warning(
+                "{n} lookups failed for good ({error_class})",
+                n=sum(len(i) if isinstance(i, list) else 1 for i in items),
+                error_class=error_class,
+            )
+            if self.failed_output:
+                for item in items:
+                    for s in item if isinstance(item, list) else [item]:
+                        print(format_item(s), file=self.failed_output)
+
+    async def _write(self):
+        inp = self.queues["results"]
+        while (ip := await inp.get()) is not None:
+            self.output.write(ip)
+            self.counters["written"] += 1
+
+
+def read_lines(input: Union[TextIO, PackedInput], n: int) -> list:
+    return list(itertools.islice(input, n))
+
+
+def format_item(item: Union[Item, list[str]]) -> str:
+    if isinstance(item, tuple):
+        return f"{item[0]}-{item[1]}"
+    if isinstance(item, list):
+        return f"batch of {len(item)} IPs"
+    return item
+
+
+def skip_input(s: str, skip: SkipTable) -> bool:
+    try:
+        ip = ipaddress.ip_address(s)
+    except ValueError:
+        error("{ip} is not a valid IP address", ip=s, event="invalid-ip")
+        return True
+
+    if skip.contains(ip):
+        error("{ip} is a private or reserved IP address", ip=s, event="skipped-ip")
+        return True
+
+    return False
@@ -0,0 +1,172 @@
+import json
+import bisect
+import ipaddress
+
+from typing import Any, Generic, Iterable, Optional, TypeVar, Union
+
+from iprecon.log import error
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+Address = Union[ipaddress.IPv4Address, ipaddress.IPv6Address]
+V = TypeVar("V")
+
+# below this many IPs, converting to arrays costs more than bisect saves
+NUMPY_MIN_BATCH = 64
+
+
+class PrefixTable(Generic[V]):
+    # longest-prefix match over known networks: nested prefixes are flattened
+    # into disjoint (start, end, id) intervals, so each IP is a single search
+    def __init__(self, prefixes: Iterable[tuple[str, V]]):
+        self.values: list[V] = []
+        items = {4: [], 6: []}
+        for cidr, value in prefixes:
+            net = ipaddress.ip_network(cidr, strict=False)
+            items[net.version].append(
+                (int(net.network_address), int(net.broadcast_address), len(self.values))
+            )
+            self.values.append(value)
+
+        self.starts, self.ends, self.ids, self.arrays = {}, {}, {}, {}
+        for version, intervals in items.items():
+            flat = flatten(intervals)
+            self.starts[version] = [s for s, _, _ in flat]
+            self.ends[version] = [e for _, e, _ in flat]
+            self.ids[version] = [i for _, _, i in flat]
+            if numpy is not None:
+                self.arrays[version] = (
+                    keys(self.starts[version], version),
+                    keys(self.ends[version], version),
+                    numpy.array(self.ids[version], dtype=numpy.int64),
+                )
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def get(self, ip: Address) -> Optional[V]:
+        starts = self.starts[ip.version]
+        i = bisect.bisect_right(starts, int(ip)) - 1
+        if i < 0 or int(ip) > self.ends[ip.version][i]:
+            return None
+        return self.values[self.ids[ip.version][i]]
+
+    def get_many(self, ips: list[Address]) -> list[Optional[V]]:
+        if numpy is None or len(ips) < NUMPY_MIN_BATCH:
+            return [self.get(ip) for ip in ips]
+
+        out: list[Optional[V]] = [None] * len(ips)
+        for version in (4, 6):
+            idx = [i for i, ip in enumerate(ips) if ip.version == version]
+            if not idx:
+                continue
+            found = self.match(version, keys([int(ips[i]) for i in idx], version))
+            for i, j in zip(idx, found.tolist()):
+                if j >= 0:
+                    out[i] = self.values[j]
+        return out
+
+    def match(self, version: int, ips: "numpy.ndarray") -> "numpy.ndarray":
+        # all IPs in one searchsorted call; returns value ids, -1 if unknown
+        starts, ends, ids = self.arrays[version]
+        if len(starts) == 0:
+            return numpy.full(len(ips), -1, dtype=numpy.int64)
+        i = numpy.searchsorted(starts, ips, side="right") - 1
+        clipped = numpy.maximum(i, 0)
+        hit = (i >= 0) & (ips <= ends[clipped])
+        return numpy.where(hit, ids[clipped], -1)
+
+
+def keys(ints: list[int], version: int) -> "numpy.ndarray":
+    # IPv4 fits into uint64; IPv6 is split into high and low 64 bit halves
+    # and compared as 16 big-endian bytes, which orders like the full number
+    if version == 4:
+        return numpy.array(ints, dtype=numpy.uint64)
+    halves = numpy.array(
+        [(i >> 64, i & 0xFFFFFFFFFFFFFFFF) for i in ints], dtype=">u8"
+    ).reshape(-1, 2)
+    return numpy.ascontiguousarray(halves).view("S16").ravel()
+
+
+def flatten(intervals: list[tuple[int, int, int]]) -> list[tuple[int, int, int]]:
+    # (start, end, id) of possibly nested prefixes -> disjoint intervals, each
+    # pointing to the most specific prefix covering it
+    out, stack, cur = [], [], 0
+
+    def emit(start: int, end: int, i: int):
+        if start <= end:
+            out.append((start, end, i))
+
+    for start, end, i in sorted(intervals, key=lambda t: (t[0], -t[1])):
+        while stack and stack[-1][1] < start:
+            _, top_end, top_i = stack.pop()
+            emit(cur, top_end, top_i)
+            cur = top_end + 1
+        if stack:
+            emit(cur, start - 1, stack[-1][2])
+        stack.append((start, end, i))
+        cur = start
+    while stack:
+        _, top_end, top_i = stack.pop()
+        emit(cur, top_end, top_i)
+        cur = top_end + 1
+    return out
+
+
+def load_prefixes(path: str) -> PrefixTable[dict]:
+    # networks from earlier JSON output (-o json); every network maps to
+    # WHOIS-style info with itself and the larger networks of the same record,
+    # shared by all IPs that match it
+    prefixes: dict[str, dict] = {}
+    with open(path) as f:
+        for n, line in enumerate(f, 1):
+            try:
+                for cidr, info in record_prefixes(json.loads(line)):
+                    prefixes.setdefault(cidr, info)  # many IPs share a network
+            except (ValueError, KeyError, TypeError, AttributeError):
+                error(
+                    "{path}:{n} is not a valid result line",
+                    path=path,
+                    n=n,
+                    event="bad-line",
+                )
+    return PrefixTable(prefixes.items())
+
+
+def record_prefixes(record: dict) -> list[tuple[str, dict]]:
+    nets = [
+        {
+            "cidr": ", ".join(net["cidr"].split("-")),
+            "name": none(net.get("name")),
+            "description": none(net.get("description")),
+        }
+        for net in record.get("networks") or []
+    ]
+    asn, asn_cidr = none(record.get("asn")), none(record.get("asn_cidr"))
+    out = []
+    for i, net in enumerate(nets):
+        info = {"asn": asn, "asn_cidr": asn_cidr, "nets": nets[i:]}
+        outside = {"asn": None, "asn_cidr": None, "nets": nets[i:]}
+        for cidr in net["cidr"].split(","):
+            cidr = cidr.strip()
+            # the ASN was looked up for one IP; networks reaching beyond its
+            # prefix (or beyond the smallest network if there is no prefix)
+            # may belong to other ASNs
+            inside = within(cidr, asn_cidr) if asn_cidr else i == 0
+            out.append((cidr, info if inside else outside))
+    return out
+
+
+def within(cidr: str, outer: str) -> bool:
+    try:
+        net, outer = ipaddress.ip_network(cidr), ipaddress.ip_network(outer)
+    except ValueError:
+        return False
+    return net.version == outer.version and net.subnet_of(outer)
+
+
+def none(s: Any) -> Any:
+    return None if s == "None" else s  # JSON output writes missing values as "None"
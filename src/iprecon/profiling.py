@@ -0,0 +1,104 @@
+import os
+import re
+import sys
+import pstats
+import cProfile
+import threading
+
+from collections import defaultdict
+from typing import Iterator
+
+HOT_PATHS = re.compile(r"iprecon|ipwhois")
+MAX_DEPTH = 64
+# from 3.12 cProfile uses sys.monitoring, which sees every thread but allows
+# only one active profiler per interpreter
+PER_THREAD = sys.version_info < (3, 12)
+
+
+class CPUProfiler:
+    # before 3.12 cProfile only sees the thread it is enabled in, so every
+    # thread started while profiling (lookups run in worker threads) gets a
+    # profiler of its own
+    def __init__(self):
+        self.profilers: list[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        if PER_THREAD:
+            threading.setprofile(self._start_thread)
+        self._start_thread()
+
+    def stop(self):
+        if PER_THREAD:
+            threading.setprofile(None)
+        for profiler in self.profilers:
+            profiler.disable()  # only affects the calling thread, others ended
+
+    def stats(self) -> pstats.Stats:
+        stats = pstats.Stats(self.profilers[0])
+        for profiler in self.profilers[1:]:
+            stats.add(profiler)
+        return stats
+
+    def _start_thread(self, *_):
+        profiler = cProfile.Profile()
+        with self._lock:
+            self.profilers.append(profiler)
+        profiler.enable()
+
+
+def write_profile(stats: pstats.Stats, path: str):
+    # .folded/.collapsed gives input for flamegraph.pl or speedscope,
+    # anything else a pstats file for snakeviz or python -m pstats
+    if path.endswith((".folded", ".collapsed")):
+        with open(path, "w") as f:
+            f.writelines(f"{line}\n" for line in collapsed_stacks(stats))
+    else:
+        stats.dump_stats(path)
+
+
+def summary(stats: pstats.Stats, top: int = 15) -> list[str]:
+    rows = [
+        (ct, tt, nc, func)
+        for func, (_, nc, tt, ct, _) in stats.stats.items()
+        if HOT_PATHS.search(func[0])
+    ]
+    rows.sort(reverse=True)
+
+    out = [f"{'cumtime':>10} {'tottime':>10} {'ncalls':>10}  function"]
+    for ct, tt, nc, func in rows[:top]:
+        out.append(f"{ct:10.3f} {tt:10.3f} {nc:10d}  {func_name(func)}")
+    return out
+
+
+def collapsed_stacks(stats: pstats.Stats) -> Iterator[str]:
+    # cProfile keeps caller/callee edges, not full stacks, so time of a
+    # function is split among the paths leading to it by their share of calls
+    callees = defaultdict(dict)
+    for func, (*_, callers) in stats.stats.items():
+        for caller, edge in callers.items():
+            callees[caller][func] = edge
+
+    def walk(func, stack, share):
+        _, _, tt, ct, _ = stats.stats[func]
+        stack = stack + [func_name(func)]
+        if (self_time := int(tt * share * 1e6)) > 0:
+            yield f"{';'.join(stack)} {self_time}"
+        if len(stack) >= MAX_DEPTH:
+            return
+        for callee, (_, _, _, edge_ct) in callees[func].items():
+            callee_ct = stats.stats[callee][3]
+            if callee_ct > 0 and func_name(callee) not in stack:
+                yield from walk(callee, stack, edge_ct * share / callee_ct)
+
+    for func, (*_, callers) in stats.stats.items():
+        if not callers:
+            yield from walk(func, [], 1.0)
+
+
+def func_name(func: tuple[str, int, str]) -> str:
+    filename, line, name = func
+    if filename == "~":
+        return name  # built-in
+    short = "/".join(filename.split(os.sep)[-2:])
+    return f"{short}:{line}({name})"
@@ -0,0 +1,77 @@
+from __future__ import annotations
+import ipaddress
+
+from iprecon.ip import IPAddress
+
+from typing import Any, Iterator, Union, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from iprecon.client import SimpleClient
+
+# block assumed when nothing is known about an address, so unallocated space
+# is skipped in reasonable steps instead of one lookup per address
+UNKNOWN_PREFIXLEN = {4: 24, 6: 48}
+
+
+class IPRange(IPAddress):
+    def __init__(
+        self,
+        first: Union[ipaddress.IPv4Address, ipaddress.IPv6Address],
+        last: Union[ipaddress.IPv4Address, ipaddress.IPv6Address],
+        whois_info: Any,
+        rdap_info: Any,
+    ):
+        super().__init__(ip=first, whois_info=whois_info, rdap_info=rdap_info)
+        self.first = first
+        self.last = last
+
+    def expand(self) -> Iterator[IPAddress]:
+        ip_type = type(self.first)
+        for i in range(int(self.first), int(self.last) + 1):
+            yield IPAddress(
+                ip=ip_type(i), whois_info=self.whois_info, rdap_info=self.rdap_info
+            )
+
+    def __str__(self) -> str:
+        cidrs = list(ipaddress.summarize_address_range(self.first, self.last))
+        if len(cidrs) == 1:
+            return str(cidrs[0])
+        return f"{self.first}-{self.last}"
+
+
+def walk_range(
+    client: SimpleClient,
+    first: Union[ipaddress.IPv4Address, ipaddress.IPv6Address],
+    last: Union[ipaddress.IPv4Address, ipaddress.IPv6Address],
+) -> Iterator[IPRange]:
+    # one lookup per allocation: look up the first address not yet covered,
+    # then jump past the end of the network it belongs to
+    ip_type = type(first)
+    current = first
+    while True:
+        ip = client.get(str(current))
+        end = block_end(ip, current)
+        if end > last:
+            end = last
+
+        yield IPRange(
+            first=current, last=end, whois_info=ip.whois_info, rdap_info=ip.rdap_info
+        )
+
+        if end >= last:
+            return
+        current = ip_type(int(end) + 1)
+
+
+def block_end(
+    ip: IPAddress, current: Union[ipaddress.IPv4Address, ipaddress.IPv6Address]
+) -> Union[ipaddress.IPv4Address, ipaddress.IPv6Address]:
+    network = ip.network()
+    if network:
+        for cidr in network.cidrs:
+            if current in cidr:
+                return cidr.broadcast_address
+
+    prefixlen = UNKNOWN_PREFIXLEN[current.version]
+    block = ipaddress.ip_network(f"{current}/{prefixlen}", strict=False)
+    return block.broadcast_address
@@ -0,0 +1,139 @@
+import os
+import gzip
+import json
+import hashlib
+import functools
+import threading
+
+from typing import Any, Callable, Optional
+
+import ipwhois
+import ipwhois.exceptions
+
+INDEX = "index.jsonl"
+OBJECTS = "objects"
+ERROR = "__error__"  # key of recorded ipwhois exceptions
+
+# ipwhois.net.Net methods that talk to registries, and the arguments that
+# identify a request (besides the IP the Net object was made for)
+NET_METHODS = {
+    "get_asn_dns": (),
+    "get_asn_verbose_dns": ("asn",),
+    "get_asn_whois": (),
+    "get_asn_http": (),
+    "get_asn_origin_whois": ("asn_registry", "asn", "server"),
+    "get_whois": ("asn_registry", "server"),
+    "get_http_json": ("url",),
+    "get_http_raw": ("url", "request_type", "form_data"),
+    "get_host": (),
+}
+
+
+class ReplayMissError(Exception):
+    pass
+
+
+class ResponseStore:
+    # raw upstream responses, gzipped and stored under the hash of their
+    # content, so the many IPs that get the same RDAP network share one file;
+    # index.jsonl maps requests to contents
+    def __init__(self, directory: str, replay: bool = False):
+        self.directory = directory
+        self.replay = replay
+        self.index: dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._index_file = None
+
+        path = os.path.join(directory, INDEX)
+        if replay and not os.path.exists(path):
+            raise Exception(f"{directory} has no recorded responses")
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    entry = json.loads(line)
+                    self.index[entry["request"]] = entry["object"]
+        if not replay:
+            os.makedirs(os.path.join(directory, OBJECTS), exist_ok=True)
+            self._index_file = open(path, "a")
+
+    @classmethod
+    def from_options(cls, options: dict[str, Any]) -> Optional["ResponseStore"]:
+        # clients of one run share the store of a directory
+        if options.get("replay"):
+            return open_store(options["replay"], replay=True)
+        if options.get("record"):
+            return open_store(options["record"], replay=False)
+        return None
+
+    def instrument(self, obj: ipwhois.IPWhois) -> ipwhois.IPWhois:
+        # route the registry requests of obj through the store
+        net = obj.net
+        for name, keys in NET_METHODS.items():
+            setattr(net, name, self._wrap(getattr(net, name), name, keys, net))
+        return obj
+
+    def _wrap(self, method: Callable, name: str, keys: tuple, net: Any) -> Callable:
+        code = method.__code__.co_varnames[1 : method.__code__.co_argcount]
+
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            params = dict(zip(code, args), **kwargs)
+            request = json.dumps(
+                [name, net.address_str] + [params.get(k) for k in keys], default=str
+            )
+            if self.replay:
+                return self.get(request)
+            try:
+                response = method(*args, **kwargs)
+            except ipwhois.exceptions.BaseIpwhoisException as e:
+                # ipwhois handles some of these itself, replay them as well
+                self.put(request, {ERROR: type(e).__name__, "message": str(e)})
+                raise
+            self.put(request, response)
+            return response
+
+        return wrapper
+
+    def get(self, request: str) -> Any:
+        digest = self.index.get(request)
+        if digest is None:
+            raise ReplayMissError(f"no recorded response for {request}")
+        response = json.loads(self._read(digest))
+        if isinstance(response, dict) and ERROR in response:
+            raise getattr(ipwhois.exceptions, response[ERROR])(response["message"])
+        return response
+
+    def put(self, request: str, response: Any):
+        if isinstance(response, list):
+            response = [str(r) for r in response]  # DNS answers
+        data = json.dumps(response).encode()
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        with self._lock:
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(f"{path}.tmp", "wb") as f:
+                    f.write(gzip.compress(data))
+                os.replace(f"{path}.tmp", path)
+            if self.index.get(request) != digest:
+                self.index[request] = digest
+                entry = {"request": request, "object": digest}
+                print(json.dumps(entry), file=self._index_file, flush=True)
+
+    @functools.lru_cache(maxsize=4096)
+    def _read(self, digest: str) -> bytes:
+        with open(self._path(digest), "rb") as f:
+            return gzip.decompress(f.read())
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, OBJECTS, digest[:2], f"{digest}.gz")
+
+
+_stores: dict[tuple[str, bool], ResponseStore] = {}
+
+
+def open_store(directory: str, replay: bool) -> ResponseStore:
+    key = (os.path.abspath(directory), replay)
+    if key not in _stores:
+        _stores[key] = ResponseStore(directory, replay=replay)
+    return _stores[key]
@@ -0,0 +1,88 @@
+import heapq
+import itertools
+import time
+
+from typing import Any, Callable, Optional
+from enum import Enum
+
+
+class ErrorClass(Enum):
+    timeout = "timeout"
+    rate_limit = "rate-limit"
+    server_error = "server-error"
+    parse_error = "parse-error"
+    other = "other"
+
+    def __str__(self):
+        return self.value
+
+
+class RetryPolicy:
+    def __init__(self, max_attempts: int, base_delay: float, max_delay: float):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int) -> float:
+        # exponential backoff: base, 2*base, 4*base, ... capped at max_delay
+        return min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+
+
+DEFAULT_POLICIES = {
+    ErrorClass.timeout: RetryPolicy(max_attempts=3, base_delay=1, max_delay=30),
+    ErrorClass.rate_limit: RetryPolicy(max_attempts=5, base_delay=10, max_delay=300),
+    ErrorClass.server_error: RetryPolicy(max_attempts=3, base_delay=2, max_delay=60),
+    ErrorClass.parse_error: RetryPolicy(max_attempts=2, base_delay=1, max_delay=1),
+    ErrorClass.other: RetryPolicy(max_attempts=1, base_delay=0, max_delay=0),
+}
+
+NO_RETRY = {
+    error_class: RetryPolicy(max_attempts=1, base_delay=0, max_delay=0)
+    for error_class in ErrorClass
+}
+
+
+class RetryQueue:
+    def __init__(
+        self,
+        classify: Callable[[Exception], ErrorClass],
+        policies: Optional[dict[ErrorClass, RetryPolicy]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.classify = classify
+        self.policies = policies or DEFAULT_POLICIES
+        self.clock = clock
+        self.failed: dict[ErrorClass, list[Any]] = {}
+        self._heap: list[tuple[float, int, Any, int]] = []
+        self._seq = itertools.count()  # keeps heap order stable for equal due times
+
+    def add(self, item: Any, e: Exception, attempt: int) -> bool:
+        # schedules another attempt for item and returns True,
+        # or records it as failed for good and returns False
+        error_class = self.classify(e)
+        policy = self.policies.get(error_class, DEFAULT_POLICIES[ErrorClass.other])
+        if attempt >= policy.max_attempts:
+            self.fail(item, error_class)
+            return False
+
+        due = self.clock() + policy.delay(attempt)
+        heapq.heappush(self._heap, (due, next(self._seq), item, attempt + 1))
+        return True
+
+    def fail(self, item: Any, error_class: ErrorClass):
+        self.failed.setdefault(error_class, []).append(item)
+
+    def pop_due(self) -> Optional[tuple[Any, int]]:
+        if self._heap and self._heap[0][0] <= self.clock():
+            _, _, item, attempt = heapq.heappop(self._heap)
+            return item, attempt
+        return None
+
+    def next_due(self) -> Optional[float]:
+        # seconds until the next retry is due, None if nothing is scheduled
+        if not self._heap:
+            return None
+        return max(0.0, self._heap[0][0] - self.clock())
+
+    def __len__(self) -> int:
+        return len(self._heap)
@@ -0,0 +1,134 @@
+import heapq
+import pickle
+import tempfile
+import ipaddress
+
+from enum import Enum
+from typing import Any, BinaryIO, Iterable, Iterator
+
+from iprecon.ip import IPAddress
+from iprecon.output import Writer
+from iprecon.ranges import IPRange
+
+RUN_SIZE = 100_000  # records sorted in memory before spilling to disk
+MIN_RUN_SIZE = 1000
+MAX_RUNS = 64  # run files kept open before they are merged into one
+
+
+class SortKey(Enum):
+    ip = "ip"
+    asn = "asn"
+    network = "network"
+
+    def __str__(self):
+        return self.value
+
+
+class SortingWriter(Writer):
+    # buffers compact records, spills sorted runs to temp files and
+    # k-way merges them into the wrapped writer on close
+    def __init__(self, output: Writer, key: SortKey, run_size: int = RUN_SIZE):
+        self.output = output
+        self.key = key
+        self.run_size = run_size
+        self._buffer: list[tuple[tuple, Any]] = []
+        self._runs: list[BinaryIO] = []
+
+    def write(self, ip: IPAddress):
+        record = compact(ip)
+        self._buffer.append((sort_key(self.key, ip), record))
+        if len(self._buffer) >= self.run_size:
+            self._spill()
+
+    def close(self):
+        self._buffer.sort(key=lambda r: r[0])
+        runs = [read_run(f) for f in self._runs] + [iter(self._buffer)]
+        for _, record in heapq.merge(*runs, key=lambda r: r[0]):
+            self.output.write(expand(record))
+
+        for f in self._runs:
+            f.close()
+        self._runs, self._buffer = [], []
+        self.output.close()
+
+    def shrink(self):
+        self.run_size = max(MIN_RUN_SIZE, self.run_size // 2)
+        if len(self._buffer) >= MIN_RUN_SIZE:
+            self._spill()
+
+    def _spill(self):
+        self._buffer.sort(key=lambda r: r[0])
+        self._runs.append(write_run(self._buffer))
+        self._buffer = []
+        if len(self._runs) > MAX_RUNS:
+            self._merge_runs()
+
+    def _merge_runs(self):
+        runs = [read_run(f) for f in self._runs]
+        merged = write_run(heapq.merge(*runs, key=lambda r: r[0]))
+        for f in self._runs:
+            f.close()
+        self._runs = [merged]
+
+
+def write_run(records: Iterable[tuple[tuple, Any]]) -> BinaryIO:
+    f = tempfile.TemporaryFile()
+    pickler = pickle.Pickler(f, protocol=pickle.HIGHEST_PROTOCOL)
+    for r in records:
+        pickler.dump(r)
+        pickler.clear_memo()
+    f.seek(0)
+    return f
+
+
+def read_run(f: BinaryIO) -> Iterator[tuple[tuple, Any]]:
+    unpickler = pickle.Unpickler(f)
+    while True:
+        try:
+            yield unpickler.load()
+        except EOFError:
+            return
+
+
+def compact(ip: IPAddress) -> tuple:
+    # everything the writers need, in the shape IPAddress reads WHOIS data
+    info = {
+        "asn": ip.as_number(),
+        "asn_cidr": ip.as_cidr(),
+        "nets": [
+            {
+                "cidr": ", ".join(str(cidr) for cidr in net.cidrs),
+                "name": net.name,
+                "description": net.description,
+            }
+            for net in ip.networks()
+        ],
+    }
+    if isinstance(ip, IPRange):
+        return ip.first.packed, ip.last.packed, info
+    return ip.ip.packed, None, info
+
+
+def expand(record: tuple) -> IPAddress:
+    first, last, info = record
+    first = ipaddress.ip_address(first)
+    if last is not None:
+        last = ipaddress.ip_address(last)
+        return IPRange(first=first, last=last, whois_info=info, rdap_info=None)
+    return IPAddress(ip=first, whois_info=info, rdap_info=None)
+
+
+def sort_key(key: SortKey, ip: IPAddress) -> tuple:
+    # unknown ASNs and networks go last
+    ip_key = (ip.ip.version, int(ip.ip))
+    if key == SortKey.asn:
+        s = str(ip.as_number() or "")
+        return (not s.isdigit(), int(s) if s.isdigit() else 0, s) + ip_key
+    if key == SortKey.network:
+        network = ip.network()
+        if network is None:
+            return (True, 0, 0, 0) + ip_key
+        cidr = network.cidrs[0]
+        net_key = (cidr.version, int(cidr.network_address), cidr.prefixlen)
+        return (False,) + net_key + ip_key
+    return ip_key
@@ -0,0 +1,151 @@
+import bisect
+import ipaddress
+
+from typing import Iterable, Union
+
+# IANA IPv4/IPv6 special-purpose address registries, entries that are not
+# globally reachable (as of 2024), plus limited broadcast and reserved space
+IPV4_SPECIAL = [
+    "0.0.0.0/8",
+    "10.0.0.0/8",
+    "100.64.0.0/10",
+    "127.0.0.0/8",
+    "169.254.0.0/16",
+    "172.16.0.0/12",
+    "192.0.0.0/24",
+    "192.0.2.0/24",
+    "192.168.0.0/16",
+    "198.18.0.0/15",
+    "198.51.100.0/24",
+    "203.0.113.0/24",
+    "240.0.0.0/4",
+    "255.255.255.255/32",
+]
+IPV4_GLOBAL = [  # globally reachable exceptions inside the blocks above
+    "192.0.0.9/32",
+    "192.0.0.10/32",
+]
+IPV6_SPECIAL = [
+    "::/128",
+    "::1/128",
+    "::ffff:0:0/96",
+    "64:ff9b:1::/48",
+    "100::/64",
+    "2001::/23",
+    "2001:db8::/32",
+    "3fff::/20",
+    "5f00::/16",
+    "fc00::/7",
+    "fe80::/10",
+]
+IPV6_GLOBAL = [
+    "2001:1::1/128",
+    "2001:1::2/128",
+    "2001:3::/32",
+    "2001:4:112::/48",
+    "2001:20::/28",
+    "2001:30::/28",
+]
+
+Address = Union[ipaddress.IPv4Address, ipaddress.IPv6Address]
+
+
+class IntervalTable:
+    # sorted, disjoint [start, end] intervals of addresses as integers
+    def __init__(self, intervals: Iterable[tuple[int, int]]):
+        merged = merge(intervals)
+        self.starts = [start for start, _ in merged]
+        self.ends = [end for _, end in merged]
+
+    def __contains__(self, n: int) -> bool:
+        i = bisect.bisect_right(self.starts, n) - 1
+        return i >= 0 and n <= self.ends[i]
+
+    def covers(self, first: int, last: int) -> bool:
+        i = bisect.bisect_right(self.starts, first) - 1
+        return i >= 0 and last <= self.ends[i]
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+
+class SkipTable:
+    # exceptions are cut out of cidrs, extra is added on top of the result
+    def __init__(
+        self,
+        cidrs: Iterable[str],
+        exceptions: Iterable[str] = (),
+        extra: Iterable[str] = (),
+    ):
+        skip, holes, more = intervals(cidrs), intervals(exceptions), intervals(extra)
+        self.tables = {}
+        for version in (4, 6):
+            kept = subtract(merge(skip[version]), merge(holes[version]))
+            self.tables[version] = IntervalTable(kept + more[version])
+
+    @classmethod
+    def default(cls, extra: Iterable[str] = ()) -> "SkipTable":
+        return cls(
+            IPV4_SPECIAL + IPV6_SPECIAL,
+            exceptions=IPV4_GLOBAL + IPV6_GLOBAL,
+            extra=extra,
+        )
+
+    def contains(self, ip: Address) -> bool:
+        return int(ip) in self.tables[ip.version]
+
+    def covers(self, first: Address, last: Address) -> bool:
+        return self.tables[first.version].covers(int(first), int(last))
+
+
+def intervals(cidrs: Iterable[str]) -> dict[int, list[tuple[int, int]]]:
+    out = {4: [], 6: []}
+    for cidr in cidrs:
+        net = ipaddress.ip_network(cidr, strict=False)
+        out[net.version].append(
+            (int(net.network_address), int(net.broadcast_address))
+        )
+    return out
+
+
+def merge(intervals: Iterable[tuple[int, int]]) -> list[tuple[int, int]]:
+    out = []
+    for start, end in sorted(intervals):
+        if out and start <= out[-1][1] + 1:
+            out[-1] = (out[-1][0], max(out[-1][1], end))
+        else:
+            out.append((start, end))
+    return out
+
+
+def subtract(
+    intervals: list[tuple[int, int]], holes: list[tuple[int, int]]
+) -> list[tuple[int, int]]:
+    # both sorted and disjoint
+    out = []
+    for start, end in intervals:
+        for hole_start, hole_end in holes:
+            if hole_end < start or hole_start > end:
+                continue
+            if hole_start > start:
+                out.append((start, hole_start - 1))
+            start = hole_end + 1
+        if start <= end:
+            out.append((start, end))
+    return out
+
+
+def load_skip_list(path: str) -> list[str]:
+    # one CIDR or IP per line, blank lines and "#" comments are ignored
+    out = []
+    with open(path) as f:
+        for i, line in enumerate(f, start=1):
+            s = line.split("#", 1)[0].strip()
+            if not s:
+                continue
+            try:
+                ipaddress.ip_network(s, strict=False)
+            except ValueError as e:
+                raise ValueError(f"{path}:{i}: {e}")
+            out.append(s)
+    return out
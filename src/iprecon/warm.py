@@ -0,0 +1,125 @@
+import re
+import json
+import time
+import ipaddress
+
+from typing import Callable, Iterable, Optional, TextIO, Union
+
+import ipwhois.asn
+import ipwhois.exceptions
+import ipwhois.net
+
+from iprecon.ip import IPAddress
+from iprecon.log import error, info
+from iprecon.output import json_record
+from iprecon.prefixes import record_prefixes
+from iprecon.ranges import walk_range
+from iprecon.special import SkipTable
+from iprecon.utils import clean
+
+Prefix = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+DEFAULT_RATE = 1.0  # lookups per second
+ASN = re.compile(r"(?i)(AS)?\d+")
+# ASNOrigin needs a Net only for its connections, any public address will do
+ORIGIN_NET_ADDRESS = "8.8.8.8"
+
+
+class PacedClient:
+    # spaces the lookups of client at most 1 / rate seconds apart
+    def __init__(
+        self,
+        client,
+        rate: float = DEFAULT_RATE,
+        clock: Callable = time.monotonic,
+        sleep: Callable = time.sleep,
+    ):
+        self.client = client
+        self.interval = 1 / rate
+        self.clock = clock
+        self.sleep = sleep
+        self.lookups = 0
+        self._next = 0.0
+
+    def get(self, ip: str) -> IPAddress:
+        now = self.clock()
+        if now < self._next:
+            self.sleep(self._next - now)
+            now = self._next
+        self._next = now + self.interval
+        self.lookups += 1
+        return self.client.get(ip)
+
+
+def read_targets(
+    lines: Iterable[str], asn_prefixes: Optional[Callable] = None
+) -> list[Prefix]:
+    # prefixes, ASNs or result lines of an earlier run (-o json), merged into
+    # as few networks as possible so nothing is looked up twice
+    asn_prefixes = asn_prefixes or origin_prefixes
+    networks: dict[int, list[Prefix]] = {4: [], 6: []}
+    for line in lines:
+        s = clean(line)
+        if not s or s.startswith("#"):
+            continue
+        try:
+            if s.startswith("{"):
+                cidrs = [cidr for cidr, _ in record_prefixes(json.loads(s))]
+            elif ASN.fullmatch(s):
+                cidrs = asn_prefixes(s)
+            else:
+                cidrs = [s]
+            for cidr in cidrs:
+                network = ipaddress.ip_network(cidr, strict=False)
+                networks[network.version].append(network)
+        except ipwhois.exceptions.ASNOriginLookupError:
+            error("no prefixes found for {asn}", asn=s, event="asn-origin")
+        except (ValueError, KeyError, TypeError, AttributeError):
+            error(
+                "{target} is not a prefix, ASN or result line",
+                target=s,
+                event="bad-target",
+            )
+    return [
+        network
+        for version in (4, 6)
+        for network in ipaddress.collapse_addresses(networks[version])
+    ]
+
+
+def origin_prefixes(asn: str) -> list[str]:
+    # route objects registered for the ASN
+    origin = ipwhois.asn.ASNOrigin(ipwhois.net.Net(ORIGIN_NET_ADDRESS))
+    result = origin.lookup(asn=asn.upper(), asn_methods=["whois"])
+    return [
+        cidr.strip() for net in result["nets"] for cidr in net["cidr"].split(",")
+    ]
+
+
+def warm(
+    client: PacedClient,
+    networks: list[Prefix],
+    out: TextIO,
+    skip: SkipTable,
+) -> int:
+    # one lookup per allocation in each network, written as JSON result lines
+    # that --prefixes reads; returns the number of lines written
+    written = 0
+    for network in networks:
+        first, last = network[0], network[-1]
+        if skip.covers(first, last):
+            info("{network} is not public, skipped", network=network, event="skip")
+            continue
+        try:
+            for r in walk_range(client, first, last):
+                if r.networks():
+                    print(json.dumps(json_record(r)), file=out)
+                    written += 1
+        except Exception as e:
+            error(
+                "{network} could not be warmed: {e}",
+                network=network,
+                e=e,
+                event="warm-failed",
+            )
+    return written
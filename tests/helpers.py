@@ -0,0 +1,59 @@
+import ipaddress
+
+from typing import Iterable, Optional
+
+from iprecon.client import SimpleClient
+from iprecon.ip import IPAddress
+from iprecon.output import Writer
+
+
+class FakeClient(SimpleClient):
+    # answers every IP with the same RDAP/WHOIS info (or with its entry in
+    # rdap_infos), fails for the IPs in fail (or for all of them with error)
+    # and records what was asked
+    def __init__(
+        self,
+        rdap_info: Optional[dict] = None,
+        whois_info: Optional[dict] = None,
+        rdap_infos: Optional[dict[str, dict]] = None,
+        fail: Iterable[str] = (),
+        error: Optional[Exception] = None,
+    ):
+        self.rdap_info = rdap_info
+        self.whois_info = whois_info
+        self.rdap_infos = rdap_infos
+        self.fail = set(fail)
+        self.error = error
+        self.requested = []
+
+    def get(self, ip: str) -> IPAddress:
+        self.requested.append(ip)
+        if self.error:
+            raise self.error
+        if ip in self.fail:
+            raise Exception("lookup failed")
+        return IPAddress(
+            ip=ipaddress.ip_address(ip),
+            whois_info=self.whois_info,
+            rdap_info=self.rdap_info
+            if self.rdap_infos is None
+            else self.rdap_infos.get(ip, {}),
+        )
+
+
+class ListWriter(Writer):
+    def __init__(self):
+        self.written = []
+        self.ips = []
+        self.closed = False
+        self.shrinks = 0
+
+    def write(self, ip: IPAddress):
+        self.written.append(str(ip))
+        self.ips.append(ip)
+
+    def close(self):
+        self.closed = True
+
+    def shrink(self):
+        self.shrinks += 1
@@ -0,0 +1,120 @@
+import io
+import contextlib
+
+import ipaddress
+from iprecon.aggregate import (
+    AggregateKey,
+    AggregateWriter,
+    DistinctCounter,
+    HyperLogLog,
+)
+from iprecon.ip import IPAddress
+from iprecon.output import OutputFormat
+from iprecon.ranges import IPRange
+
+
+def ips() -> list[IPAddress]:
+    def ip(s, asn, cidr):
+        return IPAddress(
+            ip=ipaddress.ip_address(s),
+            whois_info=None,
+            rdap_info={
+                "asn": asn,
+                "asn_registry": "arin",
+                "network": {"cidr": cidr, "name": f"net-{cidr}"},
+            },
+        )
+
+    return [
+        ip("1.2.3.4", "1", "1.2.3.0/24"),
+        ip("1.2.3.5", "1", "1.2.3.0/24"),
+        ip("1.2.4.4", "1", "1.2.4.0/24"),
+        ip("9.9.9.9", "2", "9.9.9.0/24"),
+        IPRange(
+            first=ipaddress.ip_address("5.5.5.0"),
+            last=ipaddress.ip_address("5.5.5.3"),
+            whois_info=None,
+            rdap_info={"asn": "3"},
+        ),
+    ]
+
+
+def test_aggregatewriter():
+    tests = [
+        {
+            "key": AggregateKey.asn,
+            "format": OutputFormat.csv,
+            "top": None,
+            "expected": """
+asn,ips,distinct
+3,4,1
+1,3,2
+2,1,1
+""",
+        },
+        {
+            "key": AggregateKey.network,
+            "format": OutputFormat.json,
+            "top": 2,
+            "expected": """
+{"network": "???", "ips": 4, "distinct": 1}
+{"network": "1.2.3.0/24[net-1.2.3.0/24]", "ips": 2, "distinct": 1}
+""",
+        },
+        {
+            "key": AggregateKey.registry,
+            "format": OutputFormat.text,
+            "top": None,
+            "expected": """
+         IPs     distinct registry
+           4            1 ???
+           4            3 arin
+""",
+        },
+    ]
+
+    for test in tests:
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            output = AggregateWriter(
+                test["key"], test["format"], top=test["top"], distinct=True
+            )
+            for ip in ips():
+                output.write(ip)
+            output.close()
+
+        actual = stdout.getvalue()
+        expected = test["expected"].lstrip("\n")
+        assert (
+            actual == expected
+        ), f"AggregateWriter by {test['key']} wrong:\n##########\n{actual}\n##########\n{expected}"
+
+
+def test_hyperloglog():
+    for n in [0, 1, 100, 10_000]:
+        hll = HyperLogLog()
+        for i in range(n):
+            hll.add(str(i))
+            hll.add(str(i))  # duplicates do not count
+        assert abs(hll.count() - n) <= max(1, n * 0.05), f"{hll.count()} != {n}"
+
+
+def test_distinct_counter():
+    tests = [
+        {"n": 0, "exact": True},
+        {"n": 10, "exact": True},
+        {"n": 10_000, "exact": False},
+    ]
+
+    for test in tests:
+        counter = DistinctCounter(limit=100)
+        for i in range(test["n"]):
+            counter.add(str(i))
+            counter.add(str(i))
+        n, actual = test["n"], counter.count()
+        if test["exact"]:
+            assert counter.sketch is None, f"{n} keys should be kept exactly"
+            assert actual == n, f"{actual} != {n}"
+        else:
+            assert counter.exact is None, f"{n} keys should switch to a sketch"
+            assert abs(actual - n) <= n * 0.05, f"{actual} != {n}"
@@ -0,0 +1,169 @@
+import io
+import os
+import sys
+import json
+import ipaddress
+import contextlib
+
+from iprecon.__main__ import main
+from iprecon.baseline import Baseline, ChangeWriter, parse_duration
+from iprecon.output import OutputFormat
+from iprecon.pipeline import Pipeline
+from iprecon.ranges import IPRange
+
+from helpers import FakeClient
+
+NOW = 1_700_000_000
+DAY = 24 * 3600
+
+
+def record(ip: str, asn: int, cidr: str, checked: int) -> str:
+    networks = [{"cidr": cidr, "name": "a", "description": "None"}]
+    row = {"ip": ip, "asn": str(asn), "networks": networks, "checked": checked}
+    return json.dumps(row) + "\n"
+
+
+def write_baseline(tmp_path) -> str:
+    path = tmp_path / "previous.jsonl"
+    path.write_text(
+        record("1.2.3.4", 1, "1.2.3.0/24", NOW - 2 * DAY)  # stale, unchanged
+        + record("1.2.3.5", 1, "1.2.3.0/24", NOW - 2 * DAY)  # stale, changed
+        + record("1.2.3.6", 2, "1.2.3.0/24", NOW - 60)  # fresh
+        + "not json\n"
+    )
+    return str(path)
+
+
+def test_parse_duration():
+    tests = [
+        {"s": "3600", "expected": 3600},
+        {"s": "90m", "expected": 5400},
+        {"s": "12h", "expected": 12 * 3600},
+        {"s": "7d", "expected": 7 * DAY},
+    ]
+    for test in tests:
+        result = parse_duration(test["s"])
+        assert result == test["expected"], f"{test['s']}: {result}"
+
+
+def test_baseline(tmp_path):
+    baseline = Baseline(write_baseline(tmp_path), ttl=DAY, clock=lambda: NOW)
+
+    tests = [
+        {"ip": "1.2.3.4", "entry": ("1", "1.2.3.0/24"), "fresh": False},
+        {"ip": "1.2.3.6", "entry": ("2", "1.2.3.0/24"), "fresh": True},
+        {"ip": "1.2.3.7", "entry": None, "fresh": False},
+        {"ip": "::ffff:1.2.3.6", "entry": None, "fresh": False},
+    ]
+    assert len(baseline) == 3
+    for test in tests:
+        assert baseline.get(test["ip"]) == test["entry"], test["ip"]
+        assert baseline.fresh(test["ip"]) == test["fresh"], test["ip"]
+
+
+def test_baseline_missing(tmp_path):
+    baseline = Baseline(str(tmp_path / "missing.jsonl"))
+    assert len(baseline) == 0
+
+
+def test_change_report(tmp_path):
+    baseline = Baseline(write_baseline(tmp_path), ttl=DAY, clock=lambda: NOW)
+    updated = tmp_path / "updated.jsonl"
+    client = FakeClient(
+        rdap_infos={
+            ip: {"asn": 1, "network": {"cidr": cidr, "name": "a"}}
+            for ip, cidr in [
+                ("1.2.3.4", "1.2.3.0/24"),
+                ("1.2.3.5", "1.2.0.0/16"),  # moved into a larger network
+                ("1.2.3.7", "1.2.3.0/24"),
+            ]
+        }
+    )
+    stdout = io.StringIO()
+
+    with contextlib.redirect_stdout(stdout):
+        output = ChangeWriter(baseline, OutputFormat.csv, updated=str(updated))
+        pipeline = Pipeline(client=client, output=output, baseline=baseline)
+        pipeline.run(io.StringIO("1.2.3.4\n1.2.3.5\n1.2.3.6\n1.2.3.7\n"))
+
+    assert client.requested == ["1.2.3.4", "1.2.3.5", "1.2.3.7"]
+    assert pipeline.counters["fresh"] == 1
+    assert stdout.getvalue().splitlines() == [
+        "ip,old_asn,old_network,new_asn,new_network",
+        "1.2.3.5,1,1.2.3.0/24,1,1.2.0.0/16",
+        "1.2.3.7,,,1,1.2.3.0/24",
+    ]
+
+    rows = [json.loads(line) for line in updated.read_text().splitlines()]
+    checked = {row["ip"]: row["checked"] for row in rows}
+    assert checked == {
+        "1.2.3.4": NOW,
+        "1.2.3.5": NOW,
+        "1.2.3.6": NOW - 60,
+        "1.2.3.7": NOW,
+    }
+
+
+def test_daily_runs(tmp_path, monkeypatch, capsys):
+    # the first run starts without a baseline, the next ones use the last one
+    prefixes = tmp_path / "prefixes.jsonl"
+    prefixes.write_text(record("1.2.3.4", 1, "1.2.3.0/24", NOW))
+    ips = tmp_path / "ips.txt"
+    ips.write_text("1.2.3.4\n1.2.3.5\n1.2.3.8/30\n")  # ranges are compared too
+    tests = [
+        {"baseline": "baseline.jsonl", "output": "updated.jsonl"},
+        {"baseline": "same.jsonl", "output": "same.jsonl"},
+    ]
+    for test in tests:
+        baseline = str(tmp_path / test["baseline"])
+        output = str(tmp_path / test["output"])
+        argv = ["iprecon", "-f", str(ips), "-m", "prefixes", "-o", "csv"]
+        argv += ["--prefixes", str(prefixes)]
+        argv += ["--baseline", baseline, "--baseline-output", output]
+        monkeypatch.setattr(sys, "argv", argv)
+
+        main()
+        assert capsys.readouterr().out.splitlines() == [
+            "ip,old_asn,old_network,new_asn,new_network",
+            "1.2.3.8/30,,,1,1.2.3.0/24",  # walked before the batch of IPs
+            "1.2.3.4,,,1,1.2.3.0/24",
+            "1.2.3.5,,,1,1.2.3.0/24",
+        ], f"first run with {test}"
+        assert len(open(output).readlines()) == 3
+
+        if output != baseline:
+            os.replace(output, baseline)
+        main()
+        assert capsys.readouterr().out.splitlines() == [
+            "ip,old_asn,old_network,new_asn,new_network",
+        ], f"second run with {test}"
+        assert len(open(output).readlines()) == 3
+
+
+def test_split_ranges(tmp_path):
+    # a range looked up again replaces old range rows it overlaps, even if
+    # it was split into allocations differently
+    path = tmp_path / "previous.jsonl"
+    path.write_text(
+        record("1.2.3.0/29", 1, "1.2.3.0/24", NOW - 2 * DAY)
+        + record("1.2.4.0/30", 1, "1.2.4.0/24", NOW - 2 * DAY)
+    )
+    baseline = Baseline(str(path), ttl=DAY, clock=lambda: NOW)
+    updated = tmp_path / "updated.jsonl"
+    rdap_info = {"asn": 1, "network": {"cidr": "1.2.3.0/30", "name": "a"}}
+
+    with contextlib.redirect_stdout(io.StringIO()) as stdout:
+        output = ChangeWriter(baseline, OutputFormat.csv, updated=str(updated))
+        output.write(
+            IPRange(
+                first=ipaddress.ip_address("1.2.3.0"),
+                last=ipaddress.ip_address("1.2.3.3"),
+                whois_info=None,
+                rdap_info=rdap_info,
+            )
+        )
+        output.close()
+
+    assert stdout.getvalue().splitlines()[1:] == ["1.2.3.0/30,,,1,1.2.3.0/30"]
+    rows = [json.loads(line)["ip"] for line in updated.read_text().splitlines()]
+    assert rows == ["1.2.3.0/30", "1.2.4.0/30"], rows
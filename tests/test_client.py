@@ -0,0 +1,321 @@
+import socket
+import asyncio
+import threading
+import socketserver
+import pytest
+import ipwhois.exceptions
+import ipwhois.asn
+import ipwhois.net
+import ipwhois.rdap
+import ipwhois.whois
+
+from iprecon.client import (
+    SimpleRDAPClient,
+    SimpleWHOISClient,
+    FallbackClient,
+    get_provider,
+    providers,
+    classify_error,
+    parse_rdap_network,
+    parse_whois_nets,
+)
+from iprecon.retry import ErrorClass
+
+from helpers import FakeClient
+
+
+def test_classify_error():
+    tests = [
+        {
+            "error": ipwhois.exceptions.HTTPRateLimitError("rate limit"),
+            "expected": ErrorClass.rate_limit,
+        },
+        {
+            "error": ipwhois.exceptions.HTTPLookupError(
+                "HTTP lookup failed for http://x with error code 503."
+            ),
+            "expected": ErrorClass.server_error,
+        },
+        {
+            "error": ipwhois.exceptions.HTTPLookupError(
+                "HTTP lookup failed for http://x with error code 404."
+            ),
+            "expected": ErrorClass.other,
+        },
+        {
+            "error": ipwhois.exceptions.HTTPLookupError(
+                "HTTP lookup failed for http://x."
+            ),
+            "expected": ErrorClass.timeout,
+        },
+        {"error": socket.timeout(), "expected": ErrorClass.timeout},
+        {
+            "error": ipwhois.exceptions.ASNParseError("bad"),
+            "expected": ErrorClass.parse_error,
+        },
+        {
+            "error": ipwhois.exceptions.IPDefinedError("reserved"),
+            "expected": ErrorClass.other,
+        },
+    ]
+
+    for test in tests:
+        actual = classify_error(test["error"])
+        expected = test["expected"]
+        assert (
+            actual == expected
+        ), f"classify_error({test['error']!r}) = {actual} but should be {expected}"
+
+
+def fake_client(**info) -> FakeClient:
+    for value in info.values():
+        if isinstance(value, Exception):
+            return FakeClient(error=value)  # raised for every lookup
+    return FakeClient(**info)
+
+
+def test_fallback_client():
+    rdap = {"network": {"cidr": "1.2.3.0/24", "name": "rdap-net"}}
+    whois = {"nets": [{"cidr": "1.2.3.0/28", "name": "whois-net"}]}
+    tests = [
+        {"rdap": rdap, "whois": whois, "expected": "1.2.3.0/24[rdap-net]", "calls": 0},
+        {"rdap": {}, "whois": whois, "expected": "1.2.3.0/28[whois-net]", "calls": 1},
+        {
+            "rdap": Exception("rdap down"),
+            "whois": whois,
+            "expected": "1.2.3.0/28[whois-net]",
+            "calls": 1,
+        },
+        {
+            "rdap": {"asn": 1, "asn_cidr": "1.2.0.0/16"},
+            "whois": Exception("whois down"),
+            "expected": "1.2.0.0/16[asn-1]",
+            "calls": 1,
+        },
+    ]
+
+    for test in tests:
+        fallback = fake_client(whois_info=test["whois"])
+        client = FallbackClient(fake_client(rdap_info=test["rdap"]), fallback)
+
+        actual = str(client.get("1.2.3.4").network())
+        expected = test["expected"]
+        assert (
+            actual == expected
+        ), f"FallbackClient.get().network() = {actual} but should be {expected}"
+        assert len(fallback.requested) == test["calls"]
+
+
+def test_parse_rdap_network():
+    tests = [
+        {
+            "handle": "NET-1-2-3-0-1",
+            "ipVersion": "v4",
+            "startAddress": "001.002.003.000",
+            "endAddress": "001.002.003.255",
+            "name": " EXAMPLE-NET ",
+            "remarks": [
+                {"title": "remark1", "description": ["line 1", "line 2"]},
+                {"description": ["no title"]},
+                {},
+            ],
+            "entities": [{"handle": "ORG-1", "roles": ["registrant"]}],
+        },
+        {
+            "handle": "2001:db8::/32",
+            "ipVersion": "v6",
+            "startAddress": "2001:db8::",
+            "endAddress": "2001:db8:ffff:ffff:ffff:ffff:ffff:ffff",
+        },
+        {
+            "handle": "NET-1-2-3-0-1",
+            "ipVersion": "v4",
+            "startAddress": "1.2.3.0",
+            "endAddress": "1.2.4.255",
+            "remarks": [],
+        },
+    ]
+
+    for response in tests:
+        expected = ipwhois.rdap._RDAPNetwork(response)
+        expected.parse()
+        expected = {
+            "cidr": expected.vars["cidr"],
+            "name": expected.vars["name"],
+            "remarks": [
+                {"title": r["title"], "description": r["description"]}
+                for r in expected.vars["remarks"]
+            ]
+            if expected.vars["remarks"] is not None
+            else None,
+        }
+
+        actual = parse_rdap_network(response)
+        assert (
+            actual == expected
+        ), f"parse_rdap_network({response}) = {actual} but should be {expected}"
+
+
+WHOIS_RESPONSE = """
+NetRange:       8.8.8.0 - 8.8.8.255
+CIDR:           8.8.8.0/24
+NetName:        GOGL
+OrgName:        Google LLC
+
+NetRange:       8.8.8.0 - 8.8.8.127
+CIDR:           8.8.8.0/25
+NetName:        GOGL-SUB
+"""
+ASN_DATA = {
+    "asn": "15169",
+    "asn_cidr": "8.8.8.0/24",
+    "asn_country_code": "US",
+    "asn_registry": "arin",
+    "asn_date": "1992-12-01",
+    "asn_description": "GOOGLE, US",
+}
+
+
+def test_parse_whois_nets(monkeypatch):
+    expected = ipwhois.whois.Whois(ipwhois.net.Net("8.8.8.8")).lookup(
+        response=WHOIS_RESPONSE, asn_data=ASN_DATA, is_offline=True
+    )["nets"]
+    actual = parse_whois_nets("8.8.8.8", WHOIS_RESPONSE, ASN_DATA)
+    assert [n["cidr"] for n in actual] == [n["cidr"] for n in expected]
+    assert [n["name"] for n in actual] == ["GOGL", "GOGL-SUB"]
+
+    monkeypatch.setattr(
+        ipwhois.net.Net, "get_whois", lambda self, *a, **kw: WHOIS_RESPONSE
+    )
+    monkeypatch.setattr(
+        ipwhois.asn.IPASN, "lookup", lambda self, *a, **kw: dict(ASN_DATA)
+    )
+    tests = [
+        {"parse_workers": 0},
+        {"parse_workers": 2},  # parsed in spawned processes
+    ]
+    for test in tests:
+        client = SimpleWHOISClient(parse_workers=test["parse_workers"])
+        try:
+            ip = client.get("8.8.8.8")
+        finally:
+            client.close()
+        assert (
+            str(ip.network()) == "8.8.8.0/25[GOGL-SUB]"
+        ), f"network() with {test} is {ip.network()}"
+        assert ip.as_number() == "15169"
+
+
+def test_get_provider():
+    assert {"whois", "rdap", "rdap-bulk", "rdap-whois"} <= set(providers())
+
+    client = get_provider("rdap", {"lean_rdap": True})
+    assert isinstance(client, SimpleRDAPClient) and client.lean
+
+    client = get_provider("rdap-whois", {})
+    assert isinstance(client, FallbackClient) and not client.primary.lean
+    assert get_provider("rdap-bulk", {}).supports_batching
+
+
+class CymruHandler(socketserver.StreamRequestHandler):
+    answers = {
+        "8.8.8.8": "15169   | 8.8.8.8          | 8.8.8.0/24          | US | arin     | 2023-12-28 | GOOGLE, US",
+        "1.1.1.1": "13335   | 1.1.1.1          | 1.1.1.0/24          | AU | apnic    | 2011-08-11 | CLOUDFLARENET, US",
+        "2.2.2.2": "NA      | 2.2.2.2          | NA                  |    | other    |            | NA",
+    }
+
+    def handle(self):
+        self.server.sessions += 1
+        assert self.rfile.readline() == b"begin\n"
+        header_sent = False
+        for line in self.rfile:
+            line = line.decode().strip()
+            if line == "verbose":
+                continue
+            if line == "end":
+                return
+            if not header_sent:
+                self.wfile.write(b"Bulk mode; whois.cymru.com [2024-01-01 00:00:00]\n")
+                header_sent = True
+            self.wfile.write(f"{self.answers[line]}\n".encode())
+            self.wfile.flush()
+
+
+def test_cymru_bulk_client():
+    with socketserver.ThreadingTCPServer(("127.0.0.1", 0), CymruHandler) as server:
+        server.sessions = 0
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        host, port = server.server_address
+
+        client = get_provider("cymru-bulk", {"cymru_host": f"{host}:{port}"})
+
+        async def get_many(batches):
+            return [
+                [str(ip.network()) async for ip in client.get_many(batch)]
+                for batch in batches
+            ]
+
+        batches = [["8.8.8.8", "1.1.1.1"], ["2.2.2.2", "8.8.8.8"]]
+        actual = asyncio.run(get_many(batches))
+        expected = [
+            ["8.8.8.0/24[asn-15169]", "1.1.1.0/24[asn-13335]"],
+            ["None", "8.8.8.0/24[asn-15169]"],
+        ]
+        assert actual == expected, f"CymruBulkClient.get_many = {actual}"
+
+        ip = client.get("1.1.1.1")
+        assert ip.as_number() == "13335"
+        assert ip.rdap_info["asn_registry"] == "apnic"
+        assert ip.rdap_info["asn_description"] == "CLOUDFLARENET, US"
+
+        client.close()
+        server.shutdown()
+
+    assert server.sessions == 2  # one for all batches, one for get
+
+
+def test_mmdb_client(tmp_path):
+    pytest.importorskip("maxminddb")
+    mmdb_writer = pytest.importorskip("mmdb_writer")
+    from netaddr import IPSet
+
+    path = str(tmp_path / "asn.mmdb")
+    writer = mmdb_writer.MMDBWriter(ip_version=6, ipv4_compatible=True)
+    writer.insert_network(
+        IPSet(["8.8.8.0/24"]),
+        {
+            "autonomous_system_number": 15169,
+            "autonomous_system_organization": "GOOGLE",
+        },
+    )
+    writer.insert_network(
+        IPSet(["2001:4860::/32"]), {"asn": "AS15169", "as_name": "Google LLC"}
+    )
+    writer.to_db_file(path)
+
+    client = get_provider("mmdb", {"mmdb": path})
+    assert client.offline
+
+    async def get_many(ips):
+        return [ip async for ip in client.get_many(ips)]
+
+    actual = [
+        (str(ip), ip.as_number(), str(ip.network()))
+        for ip in asyncio.run(get_many(["8.8.8.8", "2001:4860::1", "1.2.3.4"]))
+    ]
+    expected = [
+        ("8.8.8.8", "15169", "8.8.8.0/24[GOOGLE]"),
+        ("2001:4860::1", "15169", "2001:4860::/32[Google LLC]"),
+        ("1.2.3.4", None, "None"),
+    ]
+    assert actual == expected, f"MMDBClient.get_many = {actual}"
+
+    # as a pre-filter, only misses go to the fallback
+    rdap = {"network": {"cidr": "1.2.3.0/24", "name": "rdap"}}
+    fallback = FakeClient(rdap_info=rdap)
+    tiered = FallbackClient(client, fallback)
+    assert str(tiered.get("8.8.8.8").network()) == "8.8.8.0/24[GOOGLE]"
+    assert str(tiered.get("1.2.3.4").network()) == "1.2.3.0/24[rdap]"
+    assert fallback.requested == ["1.2.3.4"]
+
+    tiered.close()
@@ -0,0 +1,35 @@
+import io
+
+import pytest
+
+from iprecon.compression import Codec, codec_for, detect, open_input, open_output
+
+LINES = [f"10.0.{i // 256}.{i % 256}\n" for i in range(5000)]
+
+
+def test_roundtrip(tmp_path):
+    tests = [
+        {"name": "ips.txt", "codec": Codec.none},
+        {"name": "ips.txt.gz", "codec": Codec.gzip},
+        {"name": "ips.txt.xz", "codec": Codec.xz},
+        {"name": "ips.txt.zst", "codec": Codec.zstd},
+    ]
+    for test in tests:
+        if test["codec"] == Codec.zstd:
+            pytest.importorskip("zstandard")
+        path = str(tmp_path / test["name"])
+        assert codec_for(path) == test["codec"]
+
+        with open_output(path) as f:
+            f.writelines(LINES)
+
+        with open(path, "rb") as f:
+            assert detect(f) == test["codec"], f"{test['name']} detected wrongly"
+            lines = list(open_input(f))
+        assert lines == LINES, f"{test['name']} read back {len(lines)} lines"
+
+
+def test_stdin_like():
+    # pipes cannot seek, detection only peeks
+    f = io.BufferedReader(io.BytesIO(b"1.2.3.4\n5.6.7.8\n"))
+    assert list(open_input(f)) == ["1.2.3.4\n", "5.6.7.8\n"]
@@ -0,0 +1,179 @@
+import io
+import time
+import asyncio
+import ipaddress
+import threading
+
+import ipwhois.exceptions
+
+from iprecon.client import SimpleClient, SimpleRDAPClient, classify_error
+from iprecon.concurrency import AdaptiveLimit, AIMDController, RegistryMap
+from iprecon.ip import IPAddress
+from iprecon.pipeline import Pipeline
+from iprecon.retry import NO_RETRY, ErrorClass, RetryQueue
+
+from helpers import ListWriter
+
+
+class RateLimitedClient(SimpleClient):
+    # answers quickly, but rejects lookups while more than 3 run at once
+    concurrency_limit = 16
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+
+    def upstream(self, ip: str) -> str:
+        return "v6" if ":" in ip else "v4"
+
+    def get(self, ip: str) -> IPAddress:
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+            overloaded = self.running > 3
+        try:
+            time.sleep(0.002)
+            if overloaded:
+                raise ipwhois.exceptions.HTTPRateLimitError("429")
+            return IPAddress(
+                ip=ipaddress.ip_address(ip), whois_info=None, rdap_info=None
+            )
+        finally:
+            with self.lock:
+                self.running -= 1
+
+
+def test_aimd_increase():
+    controller = AIMDController("test", maximum=4)
+    for _ in range(1 + 2 + 3):  # one round per limit
+        controller.record(0.1)
+    assert controller.limit == 4
+
+    for _ in range(10):
+        controller.record(0.1)
+    assert controller.limit == 4, "limit exceeds maximum"
+
+
+def test_aimd_no_increase():
+    tests = [
+        {"latencies": [0.1, 1.0, 1.0], "error": None},
+        {"latencies": [0.1, 0.1], "error": ErrorClass.server_error},
+    ]
+    for test in tests:
+        controller = AIMDController("test", maximum=8)
+        controller.record(test["latencies"][0])
+        assert controller.limit == 2
+        for latency in test["latencies"][1:]:
+            controller.record(latency, test["error"])
+            test["error"] = None  # only the first one of the round fails
+        assert controller.limit == 2, test
+
+
+def test_aimd_decrease():
+    controller = AIMDController("test", maximum=16, initial=8)
+    controller.record(5.0, ErrorClass.rate_limit)
+    assert controller.limit == 4
+
+    # lookups that were in flight before backing off do not count again
+    for _ in range(4):
+        controller.record(5.0, ErrorClass.timeout)
+    assert controller.limit == 4
+
+    controller.record(5.0, ErrorClass.timeout)
+    assert controller.limit == 2
+
+
+def test_adaptive_limit():
+    controller = AIMDController("test", maximum=2, initial=2)
+    limit = AdaptiveLimit(controller)
+
+    async def run():
+        await limit.acquire()
+        await limit.acquire()
+        blocked = asyncio.create_task(limit.acquire())
+        await asyncio.sleep(0.01)
+        assert not blocked.done()
+        limit.release()
+        await asyncio.wait_for(blocked, 1)
+        assert limit.in_flight == 2
+
+    asyncio.run(run())
+
+
+def test_pipeline_adaptive():
+    client = RateLimitedClient()
+    pipeline = Pipeline(
+        client=client,
+        output=ListWriter(),
+        concurrency=16,
+        adaptive=True,
+        retries=RetryQueue(classify=classify_error, policies=NO_RETRY),
+    )
+    ips = [f"1.2.3.{i}" for i in range(1, 200)] + ["2a00::1"]
+    pipeline.run(io.StringIO("".join(f"{ip}\n" for ip in ips)))
+
+    limits = pipeline.concurrency_limits()
+    assert set(limits) == {"v4", "v6"}
+    # the upstream rejects more than 3 at once; the limit may end one
+    # increase above that, but stays well below the maximum of 16
+    assert 1 <= limits["v4"] <= 6, limits
+    assert "concurrency: v4=" in pipeline.stats()
+
+
+class TwoUpstreamClient(SimpleClient):
+    # upstream "a" (1.1.1.x) answers slowly, upstream "b" (2.2.2.x) quickly
+    concurrency_limit = 16
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.finished = []
+
+    def upstream(self, ip: str) -> str:
+        return "a" if ip.startswith("1.") else "b"
+
+    def get(self, ip: str) -> IPAddress:
+        time.sleep(0.3 if self.upstream(ip) == "a" else 0.01)
+        with self.lock:
+            self.finished.append(self.upstream(ip))
+        return IPAddress(ip=ipaddress.ip_address(ip), whois_info=None, rdap_info=None)
+
+
+def test_pipeline_adaptive_upstreams_independent():
+    client = TwoUpstreamClient()
+    pipeline = Pipeline(
+        client=client, output=ListWriter(), concurrency=16, adaptive=True
+    )
+    ips = [f"1.1.1.{i}" for i in range(1, 6)] + [f"2.2.2.{i}" for i in range(1, 6)]
+    pipeline.run(io.StringIO("".join(f"{ip}\n" for ip in ips)))
+
+    # "a" starts with one lookup at a time and its IPs come first; "b" must
+    # not wait behind them, so all of its lookups finish before the first of "a"
+    assert client.finished == ["b"] * 5 + ["a"] * 5, client.finished
+
+
+def test_registry_map(monkeypatch):
+    registries = RegistryMap()
+    registries.learn("193.0.6.139", "ripencc")
+    registries.learn("2001:67c:2e8::1", "ripencc")
+    registries.learn("8.8.8.8", None)
+    tests = [
+        {"ip": "193.1.2.3", "expected": "ripencc"},  # same /8
+        {"ip": "194.0.0.1", "expected": "unknown"},
+        {"ip": "2001:67c:ffff::1", "expected": "ripencc"},  # same /23
+        {"ip": "2001:4860::1", "expected": "unknown"},
+        {"ip": "8.8.4.4", "expected": "unknown"},
+    ]
+    for test in tests:
+        actual = registries.get(test["ip"])
+        assert actual == test["expected"], f"{test['ip']}: {actual}"
+
+    # clients learn from their results and key their limits by registry
+    monkeypatch.setattr(
+        "iprecon.client.lookup_rdap_lean",
+        lambda ip, store: {"asn_registry": "apnic", "network": None},
+    )
+    client = SimpleRDAPClient(lean=True)
+    assert client.upstream("1.1.1.1") == "rdap:unknown"
+    client.get("1.0.0.1")
+    assert client.upstream("1.1.1.1") == "rdap:apnic"
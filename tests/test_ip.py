@@ -1,5 +1,13 @@
 import ipaddress
-from iprecon.ip import IPAddress, is_valid_ip, is_valid_cidr, is_private_ip
+from iprecon.ip import (
+    IPAddress,
+    is_valid_ip,
+    is_valid_cidr,
+    is_private_ip,
+    is_valid_range,
+    parse_range,
+)
+from iprecon.network import Network
 
 
 def test_whois_asn():
@@ -219,3 +227,52 @@ def test_is_private_ip():
         assert (
             actual == expected
         ), f"is_private_ip({test['ip']}) = {actual} but should be {expected}"
+
+
+def test_parse_range():
+    tests = [
+        {"range": "1.2.3.0/24", "expected": ("1.2.3.0", "1.2.3.255")},
+        {"range": "1.2.3.4/24", "expected": ("1.2.3.0", "1.2.3.255")},
+        {"range": "1.2.3.4-1.2.4.5", "expected": ("1.2.3.4", "1.2.4.5")},
+        {"range": "1.2.3.4 - 1.2.3.4", "expected": ("1.2.3.4", "1.2.3.4")},
+        {
+            "range": "2001:db8::/32",
+            "expected": ("2001:db8::", "2001:db8:ffff:ffff:ffff:ffff:ffff:ffff"),
+        },
+        {"range": "1.2.3.4", "expected": None},
+        {"range": "1.2.3.5-1.2.3.4", "expected": None},
+        {"range": "1.2.3.4-2001:db8::", "expected": None},
+        {"range": "1.2.3.4/33", "expected": None},
+    ]
+
+    for test in tests:
+        expected = test["expected"]
+        assert is_valid_range(test["range"]) == (
+            expected is not None
+        ), f"is_valid_range({test['range']}) should be {expected is not None}"
+
+        if expected:
+            first, last = parse_range(test["range"])
+            actual = (str(first), str(last))
+            assert (
+                actual == expected
+            ), f"parse_range({test['range']}) = {actual} but should be {expected}"
+
+
+def test_networks_shared(monkeypatch):
+    created = []
+    init = Network.__init__
+
+    def counting_init(self, *args, **kwargs):
+        created.append(kwargs["cidrs"])  # not self, that would keep it alive
+        init(self, *args, **kwargs)
+
+    monkeypatch.setattr(Network, "__init__", counting_init)
+    info = {"network": {"cidr": "1.2.3.0/24", "name": "shared-net"}}
+    for i in range(100):
+        ip = ipaddress.IPv4Address("1.2.3.0") + i
+        network = IPAddress(ip=ip, whois_info=None, rdap_info=info).network()
+        assert str(network) == "1.2.3.0/24[shared-net]", f"{ip} has {network}"
+        del network  # only the registry keeps it until the next IP
+
+    assert len(created) == 1, f"{len(created)} networks built for one network"
@@ -0,0 +1,82 @@
+import io
+import json
+
+import pytest
+
+from iprecon import log
+from iprecon.log import close_log, error, human, info, warning
+
+
+@pytest.fixture
+def log_file(monkeypatch):
+    f = io.StringIO()
+    monkeypatch.setattr(log, "log_file", f)
+    monkeypatch.setattr(log, "_windows", {})
+    yield f
+    close_log()
+
+
+def records(f: io.StringIO) -> list[dict]:
+    return [json.loads(line) for line in f.getvalue().splitlines()]
+
+
+class Exploding:
+    def __str__(self):
+        raise AssertionError("formatted although disabled")
+
+
+def test_lazy(monkeypatch, capsys):
+    monkeypatch.setattr(log, "verbose", False)
+    monkeypatch.setattr(log, "log_file", None)
+
+    error("{ip} is not a valid IP address", ip=Exploding(), event="invalid-ip")
+    info("{x}", x=Exploding())
+
+    assert capsys.readouterr().err == ""
+
+
+def test_structured(log_file):
+    error("{ip} is not a valid IP address", ip="foo", event="invalid-ip")
+    warning("{n} lookups failed for good", n=3)
+
+    result = [{k: v for k, v in r.items() if k != "time"} for r in records(log_file)]
+    assert result == [
+        {
+            "level": "error",
+            "message": "foo is not a valid IP address",
+            "event": "invalid-ip",
+            "ip": "foo",
+        },
+        {"level": "warning", "message": "3 lookups failed for good", "n": 3},
+    ]
+
+
+def test_rate_limit(log_file, monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(log.time, "monotonic", lambda: now[0])
+
+    for i in range(log.BURST + 5):
+        error("{ip} is not a valid IP address", ip=i, event="invalid-ip")
+    assert len(records(log_file)) == log.BURST
+
+    now[0] += log.INTERVAL  # a new window reports what was suppressed
+    error("{ip} is not a valid IP address", ip="x", event="invalid-ip")
+    for _ in range(log.BURST + 2):
+        error("other message", event="other")
+    close_log()
+
+    result = [(r.get("event"), r["message"]) for r in records(log_file)]
+    suppressed = ("suppressed", "5 more 'invalid-ip' messages suppressed")
+    assert result[log.BURST] == suppressed
+    assert result[-1] == ("suppressed", "2 more 'other' messages suppressed")
+    assert len(result) == log.BURST + 1 + 1 + log.BURST + 1
+
+
+def test_human():
+    tests = [
+        {"n": 999, "expected": "999"},
+        {"n": 1234, "expected": "1.2k"},
+        {"n": 1_200_000, "expected": "1.2M"},
+    ]
+    for test in tests:
+        assert human(test["n"]) == test["expected"]
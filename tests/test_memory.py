@@ -0,0 +1,78 @@
+import io
+import tracemalloc
+
+from iprecon.memory import MemoryBudget, MemoryProfiler, parse_size
+from iprecon.pipeline import Pipeline
+
+from helpers import FakeClient, ListWriter
+
+
+def test_parse_size():
+    tests = [
+        {"s": "1024", "expected": 1024},
+        {"s": "512K", "expected": 512 << 10},
+        {"s": "1.5g", "expected": 3 << 29},
+        {"s": "200MiB", "expected": 200 << 20},
+    ]
+    for test in tests:
+        result = parse_size(test["s"])
+        assert result == test["expected"], f"{test['s']}: {result}"
+
+    for s in ["", "abc", "-1M"]:
+        try:
+            parse_size(s)
+        except ValueError:
+            continue
+        assert False, f"{s} was accepted"
+
+
+def test_memory_budget():
+    tests = [
+        {"usage": 100, "exceeded": False},
+        {"usage": 900, "exceeded": True},
+        {"usage": None, "exceeded": False},
+    ]
+    for test in tests:
+        budget = MemoryBudget(1000, usage=lambda: test["usage"])
+        result = budget.exceeded()
+        assert result == test["exceeded"], f"{test['usage']}: {result}"
+
+
+def test_should_shrink():
+    # usage stays high after a shrink, only growth triggers the next one
+    usage = iter([850, 850, 900, 950, 500, 850])
+    budget = MemoryBudget(1000, usage=lambda: next(usage))
+    actual = [budget.should_shrink() for _ in range(6)]
+    assert actual == [True, False, False, True, False, True]
+
+
+def test_pipeline_shrink():
+    output = ListWriter()
+    pipeline = Pipeline(client=FakeClient(), output=output, batch_size=40)
+    pipeline._seen.add("1.2.3.4")
+
+    pipeline.shrink()
+    pipeline.shrink()
+
+    assert pipeline.batch_size == 10
+    assert not pipeline._seen
+    assert output.shrinks == 2
+    assert pipeline.counters["shrinks"] == 2
+
+
+def test_memory_profiler():
+    profiler = MemoryProfiler(top=2)
+    profiler.start()
+    try:
+        pipeline = Pipeline(
+            client=FakeClient(), output=ListWriter(), profiler=profiler
+        )
+        pipeline.run(io.StringIO("1.2.3.4\n"))
+    finally:
+        report = profiler.report()
+        tracemalloc.stop()
+
+    labels = [label for label, _ in profiler.snapshots]
+    assert labels[0] == "start" and labels[-1] == "close"
+    assert set(labels) >= {"read", "validate", "dedup", "resolve", "write"}
+    assert report[0].startswith("memory: current")
@@ -0,0 +1,76 @@
+import io
+import urllib.request
+
+from iprecon.metrics import Histogram, Metrics, serve_metrics
+from iprecon.pipeline import Pipeline
+
+from helpers import FakeClient, ListWriter
+
+
+def run_pipeline(metrics: Metrics):
+    pipeline = Pipeline(
+        client=FakeClient(rdap_info={"asn_registry": "ripencc"}, fail=["9.9.9.9"]),
+        output=ListWriter(),
+        retries=None,
+        metrics=metrics,
+    )
+    pipeline.run(io.StringIO("1.2.3.4\n1.2.3.4\n1.2.3.5\n9.9.9.9\n10.0.0.1\n"))
+
+
+def test_histogram():
+    histogram = Histogram(buckets=(1, 5))
+    for value in [0.5, 1, 3, 10]:
+        histogram.observe(value)
+
+    assert histogram.lines("h", 'a="b"') == [
+        'h_bucket{a="b",le="1.0"} 2',
+        'h_bucket{a="b",le="5.0"} 3',
+        'h_bucket{a="b",le="+Inf"} 4',
+        'h_count{a="b"} 4',
+        'h_sum{a="b"} 14.5',
+    ]
+
+
+def test_metrics():
+    metrics = Metrics(method="rdap", format="json")
+    run_pipeline(metrics)
+    lines = metrics.render().splitlines()
+
+    tests = [
+        'iprecon_lookups_total{method="rdap",outcome="resolved"} 2',
+        'iprecon_lookups_total{method="rdap",outcome="failed"} 1',
+        'iprecon_lookups_total{method="rdap",outcome="skipped"} 1',
+        'iprecon_lookups_total{method="rdap",outcome="duplicate"} 1',
+        'iprecon_rows_written_total{format="json"} 2',
+        'iprecon_lookup_duration_seconds_count{method="rdap",registry="ripencc"} 2',
+        'iprecon_lookup_duration_seconds_count{method="rdap",registry="???"} 1',
+        'iprecon_queue_depth{queue="lines"} 0',
+    ]
+    for test in tests:
+        assert test in lines, f"{test} missing"
+    assert lines[-1] == "# EOF"
+
+
+def test_metrics_textfile(tmp_path):
+    path = tmp_path / "iprecon.prom"
+    metrics = Metrics(method="rdap", format="text", textfile=str(path))
+    run_pipeline(metrics)
+
+    assert path.read_text() == metrics.render()
+    assert [p.name for p in tmp_path.iterdir()] == ["iprecon.prom"]
+
+
+def test_serve_metrics():
+    metrics = Metrics(method="rdap", format="text")
+    run_pipeline(metrics)
+    server = serve_metrics(metrics, 0, host="127.0.0.1")
+    try:
+        port = server.server_address[1]
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as r:
+            body = r.read().decode()
+            content_type = r.headers["Content-Type"]
+    finally:
+        server.shutdown()
+
+    assert body == metrics.render()
+    assert content_type.startswith("application/openmetrics-text")
@@ -0,0 +1,51 @@
+from iprecon.network import RECENT_NETWORKS, Network
+
+
+def test_string():
+    tests = [
+        {
+            "network": Network(cidrs=["1.2.3.0/24"], name="net", description=None),
+            "max_len": 0,
+            "expected": "1.2.3.0/24[net]",
+        },
+        {
+            "network": Network(
+                cidrs=["1.2.3.0/24", "1.2.4.0/24"], name=None, description="desc"
+            ),
+            "max_len": 0,
+            "expected": "1.2.3.0/24-1.2.4.0/24[desc]",
+        },
+        {
+            "network": Network(
+                cidrs=["1.2.3.0/24"], name="a very long network name", description=None
+            ),
+            "max_len": 20,
+            "expected": "1.2.3.0/24[a ver...]",
+        },
+    ]
+
+    for test in tests:
+        network = test["network"]
+        for _ in range(2):  # second call is served from the cache
+            actual = network.string(test["max_len"])
+            assert (
+                actual == test["expected"]
+            ), f"Network.string({test['max_len']}) = {actual} but should be {test['expected']}"
+
+
+def test_get_interns():
+    a = Network.get(cidrs=["1.2.3.0/24"], name="net", description="desc")
+    b = Network.get(cidrs=["1.2.3.0/24"], name="net", description="desc")
+    c = Network.get(cidrs=["1.2.3.0/24"], name="other", description="desc")
+
+    assert a is b
+    assert a is not c
+
+    key = (("1.2.3.0/24",), "other", "desc")
+    assert key in Network._interned
+    del c
+    assert key in Network._interned  # recently used, kept for the next rows
+    for i in range(RECENT_NETWORKS):
+        cidr = f"10.0.{i // 256}.{i % 256}/32"
+        Network.get(cidrs=[cidr], name=None, description=None)
+    assert key not in Network._interned  # not kept alive once no longer recent
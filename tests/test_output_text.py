@@ -3,6 +3,7 @@ import contextlib
 
 import ipaddress
 from iprecon.ip import IPAddress
+from iprecon.network import Network
 from iprecon.output import TextWriter
 
 
@@ -280,3 +281,24 @@ def test_textwriter_rdap():
         assert (
             actual == expected
         ), f"TextWriter for rdap-test '{test['testname']}' wrong:\n##########\n{actual}\n##########\n{expected}"
+
+
+def test_textwriter_reuses_network_strings(monkeypatch):
+    calls = []
+    shortname = Network.shortname
+
+    def counting_shortname(self, max_len):
+        calls.append(max_len)
+        return shortname(self, max_len)
+
+    monkeypatch.setattr(Network, "shortname", counting_shortname)
+    info = {"network": {"cidr": "5.6.7.0/24", "name": "reused-net"}}
+    stdout = io.StringIO()
+    with contextlib.redirect_stdout(stdout):
+        output = TextWriter()
+        for i in range(100):
+            ip = ipaddress.IPv4Address("5.6.7.0") + i
+            output.write(IPAddress(ip=ip, whois_info=None, rdap_info=info))
+
+    assert stdout.getvalue().count("5.6.7.0/24[reused-net]") == 100
+    assert len(calls) == 1, f"shortname called {len(calls)} times for one network"
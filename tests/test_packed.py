@@ -0,0 +1,74 @@
+import io
+import struct
+
+from iprecon.packed import PackedInput, is_packed, pack
+from iprecon.pipeline import Pipeline
+
+from helpers import FakeClient, ListWriter
+
+
+def write_npy(path, descr: str, shape: tuple, data: bytes):
+    header = repr({"descr": descr, "fortran_order": False, "shape": shape})
+    header = header.encode().ljust(118) + b"\n"
+    length = struct.pack("<H", len(header))
+    path.write_bytes(b"\x93NUMPY\x01\x00" + length + header + data)
+
+
+def test_pack(tmp_path):
+    tests = [
+        {"ips": ["1.2.3.4", "5.6.7.8"], "size": 8 + 2 * 4},
+        {"ips": ["1.2.3.4", "2001:db8::1"], "size": 8 + 2 * 16},
+        {"ips": ["2001:db8::1", "8.8.8.8", "2001:db8::2"], "size": 8 + 3 * 16},
+    ]
+    for test in tests:
+        path = tmp_path / "ips.iprb"
+        with open(path, "wb") as f:
+            n = pack(io.StringIO("\n".join(test["ips"] + ["foo"])), f)
+
+        assert n == len(test["ips"])
+        assert path.stat().st_size == test["size"]
+        assert is_packed(str(path))
+
+        packed = PackedInput(str(path))
+        assert len(packed) == n
+        assert [str(ip) for ip in packed] == test["ips"]
+        packed.close()
+
+
+def test_npy(tmp_path):
+    ips = ["1.2.3.4", "2001:db8::1"]
+    tests = [
+        {
+            "descr": "<u4",
+            "shape": (1,),
+            "data": struct.pack("<I", 0x01020304),
+            "expected": ips[:1],
+        },
+        {
+            "descr": "<u8",
+            "shape": (2, 2),
+            "data": struct.pack("<4Q", 0, 0xFFFF01020304, 0x20010DB8 << 32, 1),
+            "expected": ips,
+        },
+    ]
+    for test in tests:
+        path = tmp_path / "ips.npy"
+        write_npy(path, test["descr"], test["shape"], test["data"])
+
+        packed = PackedInput(str(path))
+        assert [str(ip) for ip in packed] == test["expected"], test["descr"]
+        packed.close()
+
+
+def test_pipeline_packed(tmp_path):
+    path = tmp_path / "ips.iprb"
+    with open(path, "wb") as f:
+        pack(io.StringIO("1.2.3.4\n10.0.0.1\n1.2.3.4\n1.2.3.5\n"), f)
+
+    output = ListWriter()
+    pipeline = Pipeline(client=FakeClient(), output=output)
+    pipeline.run(PackedInput(str(path)))
+
+    assert sorted(output.written) == ["1.2.3.4", "1.2.3.5"]
+    assert pipeline.counters["skipped"] == 1
+    assert pipeline.counters["duplicates"] == 1
@@ -0,0 +1,189 @@
+import io
+import time
+import threading
+import ipaddress
+
+from iprecon.client import SimpleClient
+from iprecon.ip import IPAddress
+from iprecon.pipeline import Pipeline
+from iprecon.retry import NO_RETRY, ErrorClass, RetryPolicy, RetryQueue
+
+from helpers import FakeClient, ListWriter
+
+NETWORK = {"asn": 1, "network": {"cidr": "1.2.3.0/24", "name": "a"}}
+
+
+class FlakyClient(SimpleClient):
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.requested = []
+
+    def get(self, ip: str) -> IPAddress:
+        self.requested.append(ip)
+        if ip == "1.2.3.4" and self.failures > 0:
+            self.failures -= 1
+            raise TimeoutError("timed out")
+        return IPAddress(ip=ipaddress.ip_address(ip), whois_info=None, rdap_info=None)
+
+
+class SlowClient(SimpleClient):
+    concurrency_limit = 4
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+
+    def get(self, ip: str) -> IPAddress:
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(0.02)
+        with self.lock:
+            self.running -= 1
+        return IPAddress(ip=ipaddress.ip_address(ip), whois_info=None, rdap_info=None)
+
+
+class FakeBulkClient(FakeClient):
+    # get_many for single IPs, get for walking ranges
+    supports_batching = True
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.batches = []
+
+    async def get_many(self, ips):
+        self.batches.append(ips)
+        if self.error:
+            raise self.error
+        for ip in ips:
+            yield IPAddress(
+                ip=ipaddress.ip_address(ip), whois_info=None, rdap_info=None
+            )
+
+
+def test_pipeline():
+    input = io.StringIO(
+        "1.2.3.4\n"
+        "not an ip\n"
+        "10.0.0.1\n"
+        " 1.2.3.5\r\n"
+        "1.2.3.4\n"  # duplicate
+        "9.9.9.9\n"  # fails
+        "1.2.3.0/23\n"
+    )
+    client = FakeClient(rdap_info=NETWORK, fail=["9.9.9.9"])
+    output = ListWriter()
+
+    pipeline = Pipeline(client=client, output=output, queue_size=2)
+    pipeline.run(input)
+
+    assert output.written == ["1.2.3.4", "1.2.3.5", "1.2.2.0/24", "1.2.3.0/24"]
+    assert client.requested == ["1.2.3.4", "1.2.3.5", "9.9.9.9", "1.2.2.0", "1.2.3.0"]
+    assert pipeline.counters == {
+        "read": 7,
+        "skipped": 2,
+        "duplicates": 1,
+        "fresh": 0,
+        "resolved": 4,
+        "retried": 0,
+        "failed": 1,
+        "written": 4,
+        "shrinks": 0,
+    }
+
+
+def test_pipeline_concurrency():
+    tests = [
+        {"concurrency": 1, "max_running": 1},
+        {"concurrency": 3, "max_running": 3},
+        {"concurrency": 10, "max_running": 4},  # capped by the client
+    ]
+
+    for test in tests:
+        client = SlowClient()
+        output = ListWriter()
+
+        pipeline = Pipeline(
+            client=client, output=output, concurrency=test["concurrency"]
+        )
+        pipeline.run(io.StringIO("".join(f"1.2.3.{i}\n" for i in range(1, 21))))
+
+        assert sorted(output.written) == sorted(f"1.2.3.{i}" for i in range(1, 21))
+        assert client.max_running == test["max_running"]
+
+
+def test_pipeline_bulk():
+    input = io.StringIO("".join(f"1.2.3.{i}\n" for i in range(1, 6)))
+    client = FakeBulkClient()
+    output = ListWriter()
+
+    pipeline = Pipeline(client=client, output=output, batch_size=2)
+    pipeline.run(input)
+
+    assert client.batches == [
+        ["1.2.3.1", "1.2.3.2"],
+        ["1.2.3.3", "1.2.3.4"],
+        ["1.2.3.5"],
+    ]
+    assert output.written == [f"1.2.3.{i}" for i in range(1, 6)]
+
+
+def test_pipeline_bulk_ranges():
+    client = FakeBulkClient(rdap_info=NETWORK)
+    output = ListWriter()
+
+    pipeline = Pipeline(client=client, output=output, batch_size=10)
+    pipeline.run(io.StringIO("1.2.3.4\n1.2.3.0/30\n1.2.3.5\n"))
+
+    assert client.batches == [["1.2.3.4", "1.2.3.5"]]
+    assert client.requested == ["1.2.3.0"]
+    assert sorted(output.written) == ["1.2.3.0/30", "1.2.3.4", "1.2.3.5"]
+    assert pipeline.counters["failed"] == 0
+
+
+def test_pipeline_retry():
+    policies = {
+        ErrorClass.timeout: RetryPolicy(max_attempts=3, base_delay=0.01, max_delay=1)
+    }
+    tests = [
+        {"failures": 2, "written": ["1.2.3.5", "1.2.3.4"], "failed": []},
+        {"failures": 3, "written": ["1.2.3.5"], "failed": ["1.2.3.4"]},
+    ]
+
+    for test in tests:
+        client = FlakyClient(failures=test["failures"])
+        output = ListWriter()
+        failed_output = io.StringIO()
+
+        pipeline = Pipeline(
+            client=client,
+            output=output,
+            retries=RetryQueue(
+                classify=lambda e: ErrorClass.timeout, policies=policies
+            ),
+            failed_output=failed_output,
+        )
+        pipeline.run(io.StringIO("1.2.3.4\n1.2.3.5\n"))
+
+        assert output.written == test["written"]
+        assert failed_output.getvalue().split() == test["failed"]
+        assert client.requested == ["1.2.3.4", "1.2.3.5", "1.2.3.4", "1.2.3.4"]
+
+
+def test_pipeline_failed_batch(capsys):
+    client = FakeBulkClient(error=Exception("upstream down"))
+    failed_output = io.StringIO()
+
+    pipeline = Pipeline(
+        client=client,
+        output=ListWriter(),
+        batch_size=5,
+        retries=RetryQueue(classify=lambda e: ErrorClass.other, policies=NO_RETRY),
+        failed_output=failed_output,
+    )
+    pipeline.run(io.StringIO("".join(f"1.2.3.{i}\n" for i in range(1, 6))))
+
+    assert pipeline.counters["failed"] == 5
+    assert len(failed_output.getvalue().split()) == 5
+    assert "5 lookups failed for good" in capsys.readouterr().err
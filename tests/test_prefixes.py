@@ -0,0 +1,148 @@
+import json
+import random
+import asyncio
+import ipaddress
+
+import pytest
+
+from iprecon import prefixes
+from iprecon.client import PrefixClient
+from iprecon.prefixes import PrefixTable, flatten, load_prefixes, record_prefixes
+
+
+def test_flatten():
+    tests = [
+        {
+            "intervals": [(0, 99, 0), (10, 19, 1)],
+            "expected": [(0, 9, 0), (10, 19, 1), (20, 99, 0)],
+        },
+        {
+            "intervals": [(0, 9, 0), (20, 29, 1)],
+            "expected": [(0, 9, 0), (20, 29, 1)],
+        },
+        {
+            "intervals": [(0, 99, 0), (0, 49, 1), (40, 49, 2)],
+            "expected": [(0, 39, 1), (40, 49, 2), (50, 99, 0)],
+        },
+    ]
+    for test in tests:
+        result = flatten(test["intervals"])
+        assert result == test["expected"], f"{test['intervals']}: {result}"
+
+
+def table() -> PrefixTable:
+    return PrefixTable(
+        [
+            ("10.0.0.0/8", "a"),
+            ("10.1.0.0/16", "b"),
+            ("10.1.2.0/24", "c"),
+            ("2001:db8::/32", "d"),
+            ("2001:db8:0:1::/64", "e"),
+        ]
+    )
+
+
+def test_prefix_table():
+    tests = [
+        {"ip": "10.0.0.1", "expected": "a"},
+        {"ip": "10.1.3.4", "expected": "b"},
+        {"ip": "10.1.2.3", "expected": "c"},
+        {"ip": "10.1.255.255", "expected": "b"},
+        {"ip": "11.0.0.0", "expected": None},
+        {"ip": "9.255.255.255", "expected": None},
+        {"ip": "2001:db8::1", "expected": "d"},
+        {"ip": "2001:db8:0:1:ffff::1", "expected": "e"},
+        {"ip": "2001:db9::", "expected": None},
+    ]
+    t = table()
+    for test in tests:
+        result = t.get(ipaddress.ip_address(test["ip"]))
+        assert result == test["expected"], f"{test['ip']}: {result}"
+
+
+def test_prefix_table_many(monkeypatch):
+    # same answers with numpy as with bisect, for a batch large enough for numpy
+    t = table()
+    random.seed(1)
+    ips = [
+        ipaddress.IPv4Address(random.randrange(9 << 24, 12 << 24)) for _ in range(500)
+    ]
+    ips += [
+        ipaddress.IPv6Address((0x20010DB8 << 96) + random.randrange(1 << 97))
+        for _ in range(500)
+    ]
+    random.shuffle(ips)
+
+    expected = [t.get(ip) for ip in ips]
+    if prefixes.numpy is not None:
+        assert t.get_many(ips) == expected
+
+    monkeypatch.setattr(prefixes, "numpy", None)
+    assert t.get_many(ips) == expected
+
+
+def test_prefix_table_empty():
+    if prefixes.numpy is None:
+        pytest.skip("numpy not installed")
+    t = PrefixTable([("10.0.0.0/8", "a")])
+    ips = [ipaddress.ip_address("2001:db8::1")] * 100
+    assert t.get_many(ips) == [None] * 100
+
+
+def test_prefix_client(tmp_path):
+    path = tmp_path / "previous.jsonl"
+    networks = [
+        {"cidr": "10.1.2.0/24", "name": "SMALL", "description": "None"},
+        {"cidr": "10.0.0.0/8", "name": "BIG", "description": "big one"},
+    ]
+    rows = [
+        {"ip": ip, "asn": "64500", "asn_cidr": "10.0.0.0/8", "networks": networks}
+        for ip in ["10.1.2.3", "10.1.2.4"]
+    ]
+    path.write_text("".join(json.dumps(row) + "\n" for row in rows) + "garbage\n")
+
+    assert len(load_prefixes(str(path))) == 2
+
+    client = PrefixClient(str(path))
+    tests = [
+        {"ip": "10.1.2.200", "asn": "64500", "network": "10.1.2.0/24", "count": 2},
+        {"ip": "10.9.9.9", "asn": "64500", "network": "10.0.0.0/8", "count": 1},
+        {"ip": "11.0.0.1", "asn": None, "network": None, "count": 0},
+    ]
+
+    async def get_many():
+        return [ip async for ip in client.get_many([t["ip"] for t in tests])]
+
+    for test, ip in zip(tests, asyncio.run(get_many())):
+        network = ip.network()
+        assert ip.as_number() == test["asn"], test["ip"]
+        cidr = str(network.cidrs[0]) if network else None
+        assert cidr == test["network"], test["ip"]
+        assert len(ip.networks()) == test["count"], test["ip"]
+
+
+def test_record_prefixes_nested():
+    record = {
+        "ip": "8.8.8.8",
+        "asn": "15169",
+        "asn_cidr": "8.8.8.0/24",
+        "networks": [
+            {"cidr": "8.8.8.0/24", "name": "GOGL", "description": "None"},
+            {"cidr": "8.0.0.0/9", "name": "LVLT-ORG-8-8", "description": "None"},
+        ],
+    }
+    tests = [
+        {"cidr": "8.8.8.0/24", "asn": "15169", "asn_cidr": "8.8.8.0/24", "nets": 2},
+        {"cidr": "8.0.0.0/9", "asn": None, "asn_cidr": None, "nets": 1},
+    ]
+
+    prefixes = dict(record_prefixes(record))
+    for test in tests:
+        info = prefixes[test["cidr"]]
+        assert info["asn"] == test["asn"], f"{test['cidr']}: {info['asn']}"
+        assert info["asn_cidr"] == test["asn_cidr"], f"{test['cidr']}: {info}"
+        assert len(info["nets"]) == test["nets"], f"{test['cidr']}: {info['nets']}"
+
+    record["asn_cidr"] = "None"  # no prefix known, only the smallest network
+    actual = [(cidr, info["asn"]) for cidr, info in record_prefixes(record)]
+    assert actual == [("8.8.8.0/24", "15169"), ("8.0.0.0/9", None)], actual
@@ -0,0 +1,68 @@
+import io
+import pstats
+import threading
+
+from iprecon.pipeline import Pipeline
+from iprecon.profiling import CPUProfiler, collapsed_stacks, summary, write_profile
+
+from helpers import FakeClient, ListWriter
+
+
+def profile_pipeline() -> pstats.Stats:
+    profiler = CPUProfiler()
+    profiler.start()
+    try:
+        pipeline = Pipeline(client=FakeClient(), output=ListWriter())
+        pipeline.run(io.StringIO("1.2.3.4\n1.2.3.5\n"))
+    finally:
+        profiler.stop()
+    return profiler.stats()
+
+
+def test_profiler_threads():
+    stats = profile_pipeline()
+    names = {func[2] for func in stats.stats}
+
+    assert "_resolve" in names, "event loop thread not profiled"
+    assert "get" in names, "lookup thread not profiled"
+
+
+def test_profiler_plain_threads():
+    ran = []
+
+    def work():
+        ran.append(sum(range(1000)))
+
+    profiler = CPUProfiler()
+    profiler.start()
+    try:
+        thread = threading.Thread(target=work)
+        thread.start()
+        thread.join(5)
+    finally:
+        profiler.stop()
+
+    assert ran, "thread died before running its target"
+    assert "work" in {func[2] for func in profiler.stats().stats}
+
+
+def test_summary():
+    lines = summary(profile_pipeline(), top=5)
+
+    assert lines[0].split() == ["cumtime", "tottime", "ncalls", "function"]
+    assert 1 < len(lines) <= 6
+    assert all("iprecon" in line or "ipwhois" in line for line in lines[1:])
+
+
+def test_write_profile(tmp_path):
+    stats = profile_pipeline()
+
+    write_profile(stats, str(tmp_path / "out.prof"))
+    assert pstats.Stats(str(tmp_path / "out.prof")).stats
+
+    write_profile(stats, str(tmp_path / "out.folded"))
+    lines = (tmp_path / "out.folded").read_text().splitlines()
+    assert lines and len(lines) == len(list(collapsed_stacks(stats)))
+    for line in lines:
+        stack, value = line.rsplit(" ", 1)
+        assert stack and int(value) > 0, line
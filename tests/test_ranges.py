@@ -0,0 +1,46 @@
+import ipaddress
+
+from iprecon.ranges import IPRange, walk_range
+
+from helpers import FakeClient
+
+
+def test_walk_range():
+    client = FakeClient(
+        rdap_infos={
+            "1.2.3.0": {"asn": 1, "network": {"cidr": "1.2.0.0/23", "name": "a"}},
+        }
+    )
+
+    ranges = list(
+        walk_range(
+            client, ipaddress.ip_address("1.2.3.0"), ipaddress.ip_address("1.2.5.9")
+        )
+    )
+    actual = [(str(r), str(r.as_number())) for r in ranges]
+
+    expected = [
+        ("1.2.3.0/24", "1"),  # clipped to the end of the allocation
+        ("1.2.4.0/24", "None"),  # nothing known, skip an unknown block
+        ("1.2.5.0-1.2.5.9", "None"),  # clipped to the end of the input range
+    ]
+    assert actual == expected, f"walk_range = {actual} but should be {expected}"
+    assert client.requested == ["1.2.3.0", "1.2.4.0", "1.2.5.0"]
+
+
+def test_expand():
+    r = IPRange(
+        first=ipaddress.ip_address("1.2.3.254"),
+        last=ipaddress.ip_address("1.2.4.1"),
+        whois_info=None,
+        rdap_info={"asn": 1},
+    )
+
+    actual = [(str(ip), ip.as_number()) for ip in r.expand()]
+    expected = [
+        ("1.2.3.254", 1),
+        ("1.2.3.255", 1),
+        ("1.2.4.0", 1),
+        ("1.2.4.1", 1),
+    ]
+    assert actual == expected, f"IPRange.expand() = {actual} but should be {expected}"
@@ -0,0 +1,76 @@
+import os
+
+import ipwhois.exceptions
+import ipwhois.net
+import pytest
+
+from iprecon.client import SimpleRDAPClient, SimpleWHOISClient
+from iprecon.replay import ReplayMissError, ResponseStore
+
+ASN_ANSWER = '"15169 | 8.8.8.0/24 | US | arin | 1992-12-01"'
+RDAP_RESPONSE = {
+    "handle": "NET-8-8-8-0-1",
+    "ipVersion": "v4",
+    "startAddress": "8.8.8.0",
+    "endAddress": "8.8.8.255",
+    "name": "GOGL",
+}
+WHOIS_RESPONSE = """
+NetRange:       8.8.8.0 - 8.8.8.255
+CIDR:           8.8.8.0/24
+NetName:        GOGL
+"""
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    requests = []
+
+    def fake(name, response):
+        def method(self, *args, **kwargs):
+            requests.append((name, self.address_str))
+            if isinstance(response, Exception):
+                raise response
+            return response
+
+        monkeypatch.setattr(ipwhois.net.Net, name, method)
+
+    fake("get_asn_dns", [ASN_ANSWER])
+    fake("get_http_json", RDAP_RESPONSE)
+    fake("get_whois", WHOIS_RESPONSE)
+    fake("get_asn_verbose_dns", ipwhois.exceptions.ASNLookupError("no answer"))
+    return requests
+
+
+def test_record_replay(tmp_path, upstream):
+    tests = [
+        {"client": lambda store: SimpleRDAPClient(lean=True, store=store)},
+        {"client": lambda store: SimpleWHOISClient(store=store)},
+    ]
+    for test in tests:
+        recorder = ResponseStore(str(tmp_path))
+        recorded = test["client"](recorder).get("8.8.8.8")
+        n = len(upstream)
+        assert n > 0
+
+        replayer = ResponseStore(str(tmp_path), replay=True)
+        replayed = test["client"](replayer).get("8.8.8.8")
+
+        assert len(upstream) == n, "replay asked upstream"
+        assert str(replayed.network()) == str(recorded.network()) == "8.8.8.0/24[GOGL]"
+        assert replayed.as_number() == recorded.as_number() == "15169"
+
+        with pytest.raises(ReplayMissError):
+            test["client"](replayer).get("8.8.4.4")
+
+
+def test_content_addressed(tmp_path, upstream):
+    store = ResponseStore(str(tmp_path))
+    client = SimpleRDAPClient(lean=True, store=store)
+    for ip in ["8.8.8.8", "8.8.8.9"]:
+        client.get(ip)
+
+    # two requests each for the ASN and the network, but only two objects
+    objects = [f for _, _, files in os.walk(tmp_path / "objects") for f in files]
+    assert len(store.index) == 4
+    assert len(objects) == 2
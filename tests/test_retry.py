@@ -0,0 +1,49 @@
+from iprecon.retry import ErrorClass, RetryPolicy, RetryQueue
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_retry_policy_delay():
+    policy = RetryPolicy(max_attempts=10, base_delay=1, max_delay=5)
+
+    actual = [policy.delay(attempt) for attempt in range(1, 6)]
+    expected = [1, 2, 4, 5, 5]
+    assert actual == expected, f"delays = {actual} but should be {expected}"
+
+
+def test_retry_queue():
+    clock = FakeClock()
+    retries = RetryQueue(
+        classify=lambda e: (
+            ErrorClass.timeout if isinstance(e, TimeoutError) else ErrorClass.other
+        ),
+        policies={
+            ErrorClass.timeout: RetryPolicy(
+                max_attempts=2, base_delay=10, max_delay=10
+            ),
+            ErrorClass.other: RetryPolicy(max_attempts=1, base_delay=0, max_delay=0),
+        },
+        clock=clock,
+    )
+
+    assert retries.add("1.2.3.4", TimeoutError(), attempt=1)
+    assert not retries.add("1.2.3.5", ValueError(), attempt=1)
+    assert len(retries) == 1
+    assert retries.next_due() == 10
+    assert retries.pop_due() is None
+
+    clock.now = 10
+    assert retries.pop_due() == ("1.2.3.4", 2)
+    assert retries.next_due() is None
+
+    assert not retries.add("1.2.3.4", TimeoutError(), attempt=2)
+    assert retries.failed == {
+        ErrorClass.other: ["1.2.3.5"],
+        ErrorClass.timeout: ["1.2.3.4"],
+    }
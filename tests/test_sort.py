@@ -0,0 +1,91 @@
+import ipaddress
+
+from iprecon.ip import IPAddress
+from iprecon.ranges import IPRange
+from iprecon.sort import MAX_RUNS, MIN_RUN_SIZE, SortKey, SortingWriter
+
+from helpers import ListWriter
+
+
+def ips() -> list[IPAddress]:
+    def ip(s, asn, cidr, name):
+        rdap_info = {"asn": asn, "asn_cidr": "9.0.0.0/8"}
+        if cidr:
+            rdap_info["network"] = {"cidr": cidr, "name": name}
+        return IPAddress(
+            ip=ipaddress.ip_address(s), whois_info=None, rdap_info=rdap_info
+        )
+
+    return [
+        ip("9.9.9.9", "3", "9.9.9.0/24", "c"),
+        ip("2001:db8::1", "1", "2001:db8::/32", "d"),
+        ip("1.2.3.4", "20", "1.2.3.0/24", "a"),
+        ip("9.9.9.1", None, None, None),
+        IPRange(
+            first=ipaddress.ip_address("1.2.3.0"),
+            last=ipaddress.ip_address("1.2.3.3"),
+            whois_info=None,
+            rdap_info={"asn": "20", "network": {"cidr": "1.2.0.0/16", "name": "b"}},
+        ),
+    ]
+
+
+def test_sorting_writer():
+    tests = [
+        {
+            "key": SortKey.ip,
+            "expected": ["1.2.3.0/30", "1.2.3.4", "9.9.9.1", "9.9.9.9", "2001:db8::1"],
+        },
+        {
+            "key": SortKey.asn,
+            "expected": ["2001:db8::1", "9.9.9.9", "1.2.3.0/30", "1.2.3.4", "9.9.9.1"],
+        },
+        {
+            "key": SortKey.network,
+            "expected": ["1.2.3.0/30", "1.2.3.4", "9.9.9.1", "9.9.9.9", "2001:db8::1"],
+        },
+    ]
+
+    for test in tests:
+        for run_size in [1, 2, 100]:  # with and without spilling to disk
+            output = ListWriter()
+            writer = SortingWriter(output, key=test["key"], run_size=run_size)
+            for ip in ips():
+                writer.write(ip)
+            writer.close()
+
+            actual = output.written
+            assert (
+                actual == test["expected"]
+            ), f"sorted by {test['key']} ({run_size}): {actual}"
+            assert output.closed
+
+    # records survive the round trip through disk unchanged
+    output = ListWriter()
+    writer = SortingWriter(output, key=SortKey.ip, run_size=1)
+    for ip in ips():
+        writer.write(ip)
+    writer.close()
+    rows = [(str(ip), ip.as_number(), str(ip.network())) for ip in output.ips]
+    assert ("1.2.3.0/30", "20", "1.2.0.0/16[b]") in rows
+    assert ("9.9.9.1", None, "9.0.0.0/8[asn-?????]") in rows
+
+
+def test_sorting_writer_runs():
+    # many small runs are merged instead of keeping a file open for each
+    addresses = [ipaddress.ip_address(f"10.0.{i // 256}.{i % 256}") for i in range(500)]
+    output = ListWriter()
+    writer = SortingWriter(output, key=SortKey.ip, run_size=1)
+    for a in reversed(addresses):
+        writer.write(IPAddress(ip=a, whois_info=None, rdap_info=None))
+    assert len(writer._runs) <= MAX_RUNS
+    writer.close()
+    assert output.written == [str(a) for a in addresses]
+
+    # shrinking does not spill a handful of records
+    writer = SortingWriter(ListWriter(), key=SortKey.ip)
+    for ip in ips():
+        writer.write(ip)
+    for _ in range(10):
+        writer.shrink()
+    assert writer._runs == [] and writer.run_size == MIN_RUN_SIZE
@@ -0,0 +1,61 @@
+import ipaddress
+
+from iprecon.special import SkipTable, IntervalTable, load_skip_list
+
+
+def test_skip_table_default():
+    tests = [
+        {"ip": "1.2.3.4", "expected": False},
+        {"ip": "127.0.0.1", "expected": True},
+        {"ip": "10.0.0.1", "expected": True},
+        {"ip": "172.16.1.2", "expected": True},
+        {"ip": "172.32.0.1", "expected": False},
+        {"ip": "192.168.3.4", "expected": True},
+        {"ip": "100.64.0.1", "expected": True},
+        {"ip": "192.0.0.8", "expected": True},
+        {"ip": "192.0.0.9", "expected": False},  # globally reachable exception
+        {"ip": "255.255.255.255", "expected": True},
+        {"ip": "8.8.8.8", "expected": False},
+        {"ip": "::1", "expected": True},
+        {"ip": "fe80::1", "expected": True},
+        {"ip": "fd00::1", "expected": True},
+        {"ip": "2001:db8::1", "expected": True},
+        {"ip": "3fff:fff::1", "expected": True},  # documentation, RFC 9637
+        {"ip": "3fff:1000::1", "expected": False},
+        {"ip": "2001:20::1", "expected": False},  # globally reachable exception
+        {"ip": "2001:4860:4860::8888", "expected": False},
+    ]
+
+    table = SkipTable.default()
+    for test in tests:
+        actual = table.contains(ipaddress.ip_address(test["ip"]))
+        expected = test["expected"]
+        assert (
+            actual == expected
+        ), f"SkipTable.default().contains({test['ip']}) = {actual} but should be {expected}"
+
+
+def test_skip_table_extra(tmp_path):
+    path = tmp_path / "skip.txt"
+    path.write_text("# our own space\n1.2.3.0/24\n\n2001:4860::/32  # cdn\n")
+
+    table = SkipTable.default(extra=load_skip_list(str(path)))
+
+    assert table.contains(ipaddress.ip_address("1.2.3.4"))
+    assert table.contains(ipaddress.ip_address("2001:4860:4860::8888"))
+    assert not table.contains(ipaddress.ip_address("1.2.4.4"))
+    assert table.covers(
+        ipaddress.ip_address("1.2.3.10"), ipaddress.ip_address("1.2.3.20")
+    )
+    assert not table.covers(
+        ipaddress.ip_address("1.2.3.10"), ipaddress.ip_address("1.2.4.20")
+    )
+
+
+def test_interval_table():
+    table = IntervalTable([(10, 20), (15, 30), (31, 35), (50, 60)])
+
+    assert (table.starts, table.ends) == ([10, 50], [35, 60])  # merged
+    ns = [61, 5, 10, 35, 36, 50, 60, 0]
+    expected = [False, False, True, True, False, True, True, False]
+    assert [n in table for n in ns] == expected
@@ -0,0 +1,88 @@
+import io
+import json
+import ipaddress
+
+import pytest
+
+from iprecon.__main__ import warm_command
+from iprecon.prefixes import load_prefixes
+from iprecon.special import SkipTable
+from iprecon.warm import PacedClient, read_targets, warm
+
+from helpers import FakeClient
+
+
+def rdap_infos(networks: dict[str, str]) -> dict[str, dict]:
+    return {
+        ip: {"asn": "64500", "network": {"cidr": cidr, "name": "net"}}
+        for ip, cidr in networks.items()
+    }
+
+
+def test_read_targets():
+    record = {
+        "ip": "8.8.8.8",
+        "asn": "15169",
+        "asn_cidr": "8.8.8.0/24",
+        "networks": [{"cidr": "8.8.8.0/24", "name": "GOGL", "description": "x"}],
+    }
+    lines = [
+        "1.2.3.0/24\n",
+        "1.2.3.128/25\n",  # inside the one above
+        "AS64500\n",
+        "# comment\n",
+        json.dumps(record) + "\n",
+        "not a prefix\n",
+        "2a00::/32\n",
+    ]
+    actual = read_targets(lines, asn_prefixes=lambda asn: ["1.2.2.0/24"])
+    expected = ["1.2.2.0/23", "8.8.8.0/24", "2a00::/32"]
+    assert [str(n) for n in actual] == expected
+
+
+def test_warm(tmp_path):
+    client = FakeClient(
+        rdap_infos=rdap_infos(
+            {
+                "1.2.0.0": "1.2.0.0/24",
+                "1.2.1.0": "1.2.1.0/24",
+                "8.8.8.0": "8.8.8.0/24",
+            }
+        )
+    )
+    networks = [ipaddress.ip_network(n) for n in ["1.2.0.0/23", "8.8.8.0/24"]]
+    networks.append(ipaddress.ip_network("10.0.0.0/8"))  # private, never asked
+    out = io.StringIO()
+
+    n = warm(PacedClient(client, rate=1000), networks, out, skip=SkipTable.default())
+
+    assert n == 3
+    assert client.requested == ["1.2.0.0", "1.2.1.0", "8.8.8.0"]
+
+    path = tmp_path / "cache.jsonl"
+    path.write_text(out.getvalue())
+    table = load_prefixes(str(path))
+    assert len(table) == 3
+    assert table.get(ipaddress.ip_address("1.2.1.7"))["asn"] == "64500"
+
+
+def test_paced_client():
+    now, slept = [0.0], []
+
+    def sleep(s):
+        slept.append(s)
+        now[0] += s
+
+    client = PacedClient(FakeClient(), rate=2, clock=lambda: now[0], sleep=sleep)
+    for ip in ["1.1.1.1", "1.1.1.2", "1.1.1.3"]:
+        client.get(ip)
+    assert slept == [0.5, 0.5]
+    assert client.lookups == 3
+
+
+def test_warm_methods(tmp_path, capsys):
+    # methods that need local files are not offered, argparse rejects them
+    for method in ["mmdb", "mmdb-rdap", "prefixes"]:
+        with pytest.raises(SystemExit):
+            warm_command(["-m", method, "-o", str(tmp_path / "out.jsonl")])
+        assert "invalid choice" in capsys.readouterr().err, method